@@ -1,15 +1,104 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, simpledialog
-from PIL import Image, ImageTk
+import time
+T_START = time.perf_counter()   # startup timing for --timing
+
 import xml.etree.ElementTree as ET
-from threading import Timer, Thread
-import os, json, subprocess, concurrent.futures, socket, math, platform, queue
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from threading import Timer, Thread, Lock, Event, get_ident
+import os, sys, json, subprocess, concurrent.futures, socket, math, platform, queue, argparse
+import re, fnmatch, ipaddress, sqlite3, heapq
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+# tkinter, PIL and watchdog are GUI-only and imported by load_gui(), so
+# headless runs (cron, servers without a display) never pay for them.
+tk = filedialog = messagebox = ttk = simpledialog = None
+Image = ImageTk = Observer = FileSystemEventHandler = None
+
+def load_gui():
+    global tk, filedialog, messagebox, ttk, simpledialog, Image, ImageTk, Observer, FileSystemEventHandler
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk, simpledialog
+    from PIL import Image, ImageTk
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+# ----------------------------------------------------------------------
+#  Tracing (opt-in): handler timings as Chrome trace events
+# ----------------------------------------------------------------------
+class Tracer:
+    """Span timings and counters. Written as Chrome trace-event JSON
+    (chrome://tracing, Perfetto); recent durations per name feed the overlay."""
+    def __init__(self, enabled=False, max_events=200000, window=200):
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.recent = {}           # name to deque of recent values (ms)
+        self.counts = {}
+        self.window = window
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+
+    def keep(self, name, ms):
+        d = self.recent.get(name)
+        if d is None:
+            d = self.recent[name] = deque(maxlen=self.window)
+        d.append(ms)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def record(self, name, start, end):
+        self.events.append({"name": name, "ph": "X", "pid": self.pid, "tid": get_ident(),
+                            "ts": (start - self.t0) * 1e6, "dur": (end - start) * 1e6})
+        self.keep(name, (end - start) * 1000)
+
+    def counter(self, name, ms):
+        self.events.append({"name": name, "ph": "C", "pid": self.pid, "tid": get_ident(),
+                            "ts": (time.perf_counter() - self.t0) * 1e6, "args": {"ms": ms}})
+        self.keep(name, ms)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def stats(self):
+        # name to (last ms, p95 ms, count)
+        out = {}
+        for name, d in list(self.recent.items()):
+            vals = sorted(d)
+            out[name] = (d[-1], vals[int(0.95 * (len(vals) - 1))], self.counts[name])
+        return out
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, f)
+
+def traced(name):
+    # method decorator; a disabled tracer costs one attribute check
+    def wrap(fn):
+        @wraps(fn)
+        def inner(self, *args, **kwargs):
+            tracer = self.tracer
+            if not tracer.enabled:
+                return fn(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                tracer.record(name, start, time.perf_counter())
+        return inner
+    return wrap
 
 # ----------------------------------------------------------------------
 #  Data classes
 # ----------------------------------------------------------------------
+XML_FIELDS = ('ip', 'name', 'mac', 'switch', 'port', 'vlan', 'url')   # Device() argument order
+
 class Device:
     def __init__(self, ip, name, mac, switch, port, vlan, url):
         self.ip = ip
@@ -23,22 +112,785 @@ class Device:
         self.original_position = None  # (x, y) in ORIGINAL image coordinates
         self.canvas_id = None
         self.color = 'blue'
+        self.history = None        # ProbeHistory, once monitored
+        self.key = None            # registry key, set when registered
+        self.floor = None          # name of the floor it is placed on
+
+    def fields(self):
+        return tuple(getattr(self, f) for f in XML_FIELDS)
 
 class Group:
     def __init__(self, name): self.name = name
 
+class Floor:
+    def __init__(self, name, map_path):
+        self.name = name
+        self.map_path = map_path
+        self.keys = set()          # devices placed on this floor
+
+class SearchIndex:
+    """Trigram index over key / ip / name of the devices not yet placed."""
+    def __init__(self):
+        self.grams  = {}           # gram to set of keys
+        self.fields = {}           # key to (key, ip, name) lowercased
+
+    @staticmethod
+    def grams_of(text):
+        return {text[i:i+3] for i in range(len(text) - 2)}
+
+    def add(self, key, dev):
+        self.remove(key)
+        fields = tuple(f.lower() for f in (key, dev.ip or '', dev.name or ''))
+        self.fields[key] = fields
+        for f in fields:
+            for g in self.grams_of(f):
+                self.grams.setdefault(g, set()).add(key)
+
+    def remove(self, key):
+        fields = self.fields.pop(key, None)
+        if fields is None:
+            return
+        for f in fields:
+            for g in self.grams_of(f):
+                keys = self.grams.get(g)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.grams[g]
+
+    def sync(self, key, dev):
+        # only unplaced devices are searchable
+        if dev.original_position:
+            self.remove(key)
+        else:
+            self.add(key, dev)
+
+    def rank(self, key, q):
+        fields = self.fields[key]
+        if q in fields:                               return 0
+        if any(f.startswith(q) for f in fields):      return 1
+        return 2
+
+    def query(self, q):
+        q = q.lower().strip()
+        if not q:
+            return sorted(self.fields)
+        if len(q) < 3:
+            # too short for trigrams: substring scan over the unplaced devices
+            cands = [k for k, fields in self.fields.items() if any(q in f for f in fields)]
+        else:
+            postings = sorted((self.grams.get(g, ()) for g in self.grams_of(q)), key=len)
+            if not postings or not postings[0]:
+                return []
+            cands = set(postings[0]).intersection(*postings[1:])
+            cands = [k for k in cands if any(q in f for f in self.fields[k])]
+        return sorted(cands, key=lambda k: (self.rank(k, q), k))
+
+class ProbeHistory:
+    """Fixed-size ring of recent probe results: RTT in ms, -1 for no reply."""
+    def __init__(self, size=32):
+        self.samples = array('f', [0.0]) * size
+        self.count = 0
+
+    def add(self, rtt):
+        self.samples[self.count % len(self.samples)] = -1.0 if rtt is None else rtt
+        self.count += 1
+
+    def recent(self):
+        # oldest first
+        n = len(self.samples)
+        if self.count <= n:
+            return list(self.samples[:self.count])
+        i = self.count % n
+        return list(self.samples[i:]) + list(self.samples[:i])
+
+class Monitor:
+    """Continuously re-probes targets: fast after a status change, slow while
+    stable, exponential backoff for devices that stay down. At most `rate`
+    probes are started per second and at most `workers` are in flight,
+    whatever the number of targets."""
+    def __init__(self, probe, results, workers=30, rate=20.0):
+        self.probe = probe         # target to RTT in ms, None if unreachable
+        self.results = results     # queue of (key, rtt)
+        self.rate = rate
+        self.workers = workers
+        self.fast, self.slow, self.max_backoff = 5.0, 30.0, 300.0
+        self.targets = {}          # key to probe target
+        self.status = {}           # key to (up, streak of identical results)
+        self.due = {}              # key to next probe time
+        self.heap = []             # (due, key), stale entries skipped
+        self.inflight = set()
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        # the scheduler must be gone before the pool refuses new probes
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def set_targets(self, targets):
+        with self.lock:
+            now = time.monotonic()
+            for key, target in targets.items():
+                if self.targets.get(key) != target:   # new or changed: probe now
+                    self.status.pop(key, None)
+                    self.push(key, now)
+            self.targets = dict(targets)
+
+    def push(self, key, t):
+        self.due[key] = t
+        heapq.heappush(self.heap, (t, key))
+
+    def interval(self, key, up):
+        prev = self.status.get(key)
+        streak = prev[1] + 1 if prev and prev[0] == up else 0
+        self.status[key] = (up, streak)
+        if streak < 3:
+            return self.fast
+        if up:
+            return self.slow
+        return min(self.slow * 2 ** (streak - 3), self.max_backoff)
+
+    def run(self):
+        spacing = 1.0 / self.rate
+        while not self.stop_event.is_set():
+            job, wait = None, 1.0
+            with self.lock:
+                now = time.monotonic()
+                # slow probes (offline hosts) hold their slot instead of queueing up
+                while self.heap and self.heap[0][0] <= now and len(self.inflight) < self.workers:
+                    t, key = heapq.heappop(self.heap)
+                    if self.due.get(key) != t or key not in self.targets:
+                        continue                      # stale entry
+                    if key in self.inflight:          # retargeted mid-probe: retry later
+                        self.push(key, now + self.fast)
+                        continue
+                    del self.due[key]
+                    self.inflight.add(key)
+                    job = (key, self.targets[key])
+                    break
+                if job is None and self.heap:
+                    wait = min(self.heap[0][0] - now, 1.0)
+            if job:
+                self.pool.submit(self.check, *job)
+            self.stop_event.wait(max(wait if job is None else 0, spacing))
+
+    def check(self, key, target):
+        rtt = self.probe(target)
+        with self.lock:
+            self.inflight.discard(key)
+            if key in self.targets and key not in self.due:
+                self.push(key, time.monotonic() + self.interval(key, rtt is not None))
+        if not self.stop_event.is_set():
+            self.results.put((key, rtt))
+
+class RenderScheduler:
+    """The one path from background work to the canvas. Colour / position
+    updates from any thread are coalesced per device (the newest wins) and
+    applied on the Tk thread in one time-boxed batch per frame."""
+    def __init__(self, root, draw, fps=60, budget=0.008, tracer=None):
+        self.root = root
+        self.draw = draw           # Tk-thread callback(key, color)
+        self.tracer = tracer or Tracer()
+        self.interval = max(1, int(1000 / fps))
+        self.budget = budget       # s of drawing per frame, the rest waits
+        self.pending = {}          # key to colour, None to redraw as is
+        self.lock = Lock()
+
+    def start(self):
+        self.root.after(self.interval, self.frame)
+
+    def post(self, key, color=None):
+        with self.lock:
+            if color is not None or key not in self.pending:
+                self.pending[key] = color
+
+    def frame(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if batch:
+            start = time.perf_counter()
+            deadline = start + self.budget
+            items = iter(batch.items())
+            for key, color in items:
+                self.draw(key, color)
+                if time.perf_counter() > deadline:
+                    break
+            rest = dict(items)
+            if rest:
+                with self.lock:
+                    rest.update(self.pending)     # anything posted since is newer
+                    self.pending = rest
+            if self.tracer.enabled:
+                self.tracer.record("render.frame", start, time.perf_counter())
+        self.root.after(self.interval, self.frame)
+
+class StateStore:
+    """Groups and device placement in SQLite (WAL). Only dirty rows are written,
+    each batch in one transaction, from a single writer thread. The file is
+    only created by the first write, so read-only runs leave no database."""
+    def __init__(self, path):
+        self.path = path
+        self.created = not os.path.exists(path)
+        self.jobs = queue.Queue()
+        self.compact_every = 50    # batches between WAL checkpoints
+        self.writer = None         # started by the first write
+
+    def connect(self):
+        con = sqlite3.connect(self.path)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS groups (name TEXT PRIMARY KEY)")
+        con.execute("CREATE TABLE IF NOT EXISTS floors (name TEXT PRIMARY KEY, map TEXT)")
+        con.execute("CREATE TABLE IF NOT EXISTS devices (key TEXT PRIMARY KEY, groups TEXT, x REAL, y REAL, floor TEXT)")
+        if 'floor' not in [c[1] for c in con.execute("PRAGMA table_info(devices)")]:
+            try:                       # single-floor databases
+                con.execute("ALTER TABLE devices ADD COLUMN floor TEXT")
+            except sqlite3.OperationalError:
+                pass                   # the other connection got there first
+        return con
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return [], [], {}
+        con = self.connect()
+        try:
+            groups = [name for name, in con.execute("SELECT name FROM groups")]
+            floors = list(con.execute("SELECT name, map FROM floors"))
+            devices = {key: (json.loads(gs), (x, y) if x is not None else None, floor)
+                       for key, gs, x, y, floor in con.execute("SELECT key, groups, x, y, floor FROM devices")}
+        finally:
+            con.close()
+        return groups, floors, devices
+
+    def write(self, groups, floors, rows):
+        # groups / floors: full list or None if unchanged, rows: (key, groups json, x, y, floor)
+        if self.writer is None:
+            self.writer = Thread(target=self.run, daemon=True)
+            self.writer.start()
+        self.jobs.put((groups, floors, rows))
+
+    def close(self):
+        if self.writer is not None:
+            self.jobs.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def run(self):
+        # a failed batch is reported and dropped, the writer keeps draining
+        con = None
+        batches = 0
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                con = con or self.connect()
+                self.apply(con, *job)
+                batches += 1
+                if batches >= self.compact_every and self.jobs.empty():
+                    # fold the WAL back into the main file while idle
+                    con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    batches = 0
+            except sqlite3.Error as e:
+                print(f"State Error: could not save to {self.path}: {e}", file=sys.stderr)
+        if con is not None:
+            try:
+                con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                print(f"State Error: {e}", file=sys.stderr)
+            con.close()
+
+    def apply(self, con, groups, floors, rows):
+        with con:
+            if groups is not None:
+                con.execute("DELETE FROM groups")
+                con.executemany("INSERT INTO groups VALUES (?)", [(g,) for g in groups])
+            if floors is not None:
+                con.execute("DELETE FROM floors")
+                con.executemany("INSERT INTO floors VALUES (?, ?)", floors)
+            con.executemany("INSERT OR REPLACE INTO devices (key, groups, x, y, floor) VALUES (?, ?, ?, ?, ?)", rows)
+
+# ----------------------------------------------------------------------
+#  Filters – compiled once per filter text
+# ----------------------------------------------------------------------
+#  Top-level comma-separated clauses keep the old meaning: terms of the same
+#  kind are OR-ed, different kinds are AND-ed. A clause may also be a full
+#  expression with AND / OR / NOT and parentheses, e.g.
+#      (switch:sw1 OR switch:sw2) AND NOT include spare, ips:10.1.0.0/16
+#  Values with spaces, commas or parentheses can be double-quoted, e.g.
+#      include "lab printers" OR name:"printer (2)"
+#  name: / switch: / floor: / ips: accept * ? [] wildcards, ips: also CIDR ranges.
+FILTER_OPS = ('AND', 'OR', 'NOT', '(', ')')
+
+def has_wildcard(p):
+    return any(c in p for c in '*?[')
+
+@lru_cache(maxsize=1 << 17)
+def ip_of(text):
+    try:
+        return ipaddress.ip_address(text)
+    except ValueError:
+        return None
+
+class GroupTerm:
+    def __init__(self, names): self.names = frozenset(names)
+    def __call__(self, dev): return not self.names.isdisjoint(dev.groups)
+
+class FieldTerm:
+    def __init__(self, attr, patterns):
+        self.attr = attr
+        pats = [p.lower() for p in patterns if p]
+        self.exact = frozenset(p for p in pats if not has_wildcard(p))
+        wild = [fnmatch.translate(p) for p in pats if has_wildcard(p)]
+        self.wild = re.compile('|'.join(wild)) if wild else None
+
+    def __call__(self, dev):
+        v = (getattr(dev, self.attr) or '').lower()
+        return v in self.exact or (self.wild is not None and self.wild.match(v) is not None)
+
+class IpTerm(FieldTerm):
+    def __init__(self, patterns):
+        super().__init__('ip', [p for p in patterns if '/' not in p])
+        self.nets = [ipaddress.ip_network(p, strict=False) for p in patterns if '/' in p]
+
+    def __call__(self, dev):
+        if super().__call__(dev):
+            return True
+        addr = ip_of(dev.ip or '') if self.nets else None
+        return addr is not None and any(addr in n for n in self.nets)
+
+class AllOf:
+    def __init__(self, terms): self.terms = tuple(terms)
+    def __call__(self, dev): return all(t(dev) for t in self.terms)
+
+class AnyOf:
+    def __init__(self, terms): self.terms = tuple(terms)
+    def __call__(self, dev): return any(t(dev) for t in self.terms)
+
+class Not:
+    def __init__(self, term): self.term = term
+    def __call__(self, dev): return not self.term(dev)
+
+def unquote(v):
+    v = v.strip()
+    return v[1:-1] if len(v) >= 2 and v[0] == v[-1] == '"' else v
+
+def parse_term(p):
+    """Return (kind, values) for a single filter term, None if unknown."""
+    p = p.strip()
+    if p.startswith('include '):  return 'inc', [unquote(p[8:])]
+    if p.startswith('exclude '):  return 'exc', [unquote(p[8:])]
+    if p.startswith('group:'):    return 'inc', [unquote(p[6:])]
+    if p.startswith('name:'):     return 'name', [unquote(p[5:])]
+    if p.startswith('switch:'):   return 'switch', [unquote(p[7:])]
+    if p.startswith('floor:'):    return 'floor', [unquote(p[6:])]
+    if p.startswith('ips:'):      return 'ips', [unquote(i) for i in p[4:].split(';') if i.strip()]
+    return None
+
+def make_term(kind, values):
+    if kind == 'inc':  return GroupTerm(values)
+    if kind == 'exc':  return Not(GroupTerm(values))
+    if kind == 'ips':  return IpTerm(values)
+    return FieldTerm(kind, values)
+
+class FilterParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        tok = self.peek()
+        if tok is None:
+            raise ValueError("Unexpected end of filter")
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.peek()}' in filter")
+        return node
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else AnyOf(terms)
+
+    def parse_and(self):
+        terms = [self.parse_not()]
+        while self.peek() in ('AND', ','):
+            self.take()
+            terms.append(self.parse_not())
+        return terms[0] if len(terms) == 1 else AllOf(terms)
+
+    def parse_not(self):
+        tok = self.take()
+        if tok == 'NOT':
+            return Not(self.parse_not())
+        if tok == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise ValueError("Missing ')' in filter")
+            return node
+        if tok in ('include', 'exclude'):
+            tok = f"{tok} {self.take()}"
+        term = parse_term(tok)
+        if term is None:
+            raise ValueError(f"Unknown filter term '{tok}'")
+        return make_term(*term)
+
+def tokenize_filter(txt):
+    # (token, start, end); ( ) and , stand alone only outside a value, so
+    # name:printer(2) is one token, and quoted values keep their quotes
+    tokens, i, n = [], 0, len(txt)
+    while i < n:
+        c = txt[i]
+        if c.isspace():
+            i += 1
+            continue
+        if c in '(),':
+            tokens.append((c, i, i + 1))
+            i += 1
+            continue
+        start, depth = i, 0
+        while i < n:
+            c = txt[i]
+            if c == '"':
+                end = txt.find('"', i + 1)
+                if end < 0:
+                    raise ValueError("Unterminated quote in filter")
+                i = end + 1
+                continue
+            if c.isspace() or (c in '),' and depth == 0):
+                break
+            if c == '(':   depth += 1
+            elif c == ')': depth -= 1
+            i += 1
+        tokens.append((txt[start:i], start, i))
+    return tokens
+
+def split_clauses(txt):
+    # (clause text, its tokens), split on commas outside parentheses
+    out, depth, start, clause = [], 0, 0, []
+    for tok, i, j in tokenize_filter(txt):
+        if tok == '(':   depth += 1
+        elif tok == ')': depth -= 1
+        if tok == ',' and depth <= 0:
+            if clause:
+                out.append((txt[start:i].strip(), clause))
+            start, clause = j, []
+        else:
+            clause.append(tok)
+    if clause:
+        out.append((txt[start:].strip(), clause))
+    return out
+
+@lru_cache(maxsize=64)
+def compile_filter(txt):
+    simple = {}      # kind to values (legacy clauses)
+    compound = []
+    for clause, tokens in split_clauses(txt):
+        if any(t in FILTER_OPS for t in tokens):
+            compound.append(FilterParser(tokens).parse())
+        else:
+            term = parse_term(clause)
+            if term:
+                simple.setdefault(term[0], []).extend(term[1])
+    return AllOf([make_term(k, v) for k, v in simple.items()] + compound)
+
+# ----------------------------------------------------------------------
+#  Core: devices, state, filters, probing – no GUI dependencies
+# ----------------------------------------------------------------------
+class MapperCore:
+    def __init__(self, xml_file="network.xml", state_db="mapper_state.db", map_image_path="drawing.jpg",
+                 trace_file=None):
+        self.devices = {}          # key to Device
+        self.groups  = {}          # name to Group
+        self.xml_file = xml_file
+        self.state_db = state_db
+        self.state_file = os.path.splitext(state_db)[0] + ".json"   # legacy, imported once
+
+        # Floors: placed devices are partitioned by floor; search / filter /
+        # ping work on the active floor unless all_floors is set
+        self.floors = {}           # name to Floor
+        self.default_floor = "Main"
+        self.map_image_path = map_image_path   # map of the default floor
+        self.active_floor = None
+        self.all_floors = False
+
+        # Filter match set, reused until the filter text or the data changes
+        self.data_version = 0
+        self.filter_cache = None   # (text, data_version, matching keys)
+
+        self.monitor = None        # Monitor, while continuous monitoring is on
+
+        self.trace_file = trace_file
+        self.tracer = Tracer(enabled=bool(trace_file))
+
+        # Persistence: dirty keys / groups written by save_state
+        self.store = StateStore(self.state_db)
+        self.dirty = set()
+        self.groups_dirty = False
+        self.floors_dirty = False
+
+    # hooks for front-ends
+    def report_error(self, title, msg):
+        print(f"{title}: {msg}", file=sys.stderr)
+
+    def device_changed(self, key, dev):
+        pass
+
+    def device_removed(self, key, dev):
+        pass
+
+    # ------------------------------------------------------------------
+    #  XML / State
+    # ------------------------------------------------------------------
+    def get_text(self, parent, tag, default=''):
+        el = parent.find(tag)
+        return el.text.strip() if el is not None and el.text else default
+
+    @traced("read_xml")
+    def read_xml(self):
+        # streamed: {key: fields in XML_FIELDS order}, elements freed as we go
+        records = {}
+        for _, el in ET.iterparse(self.xml_file):
+            if el.tag != 'device':
+                continue
+            fields = tuple(self.get_text(el, tag) for tag in XML_FIELDS)
+            ip, name, mac = fields[:3]
+            key = name or ip or mac or f"unk_{len(records)}"
+            while key in records:
+                key += "_dup"
+            records[key] = fields
+            el.clear()
+        return records
+
+    def apply_xml(self, records):
+        # diff against the registry, touching only what changed
+        added, removed, changed = [], [], []
+        for key in [k for k in self.devices if k not in records]:
+            dev = self.devices.pop(key)
+            if dev.floor in self.floors:
+                self.floors[dev.floor].keys.discard(key)
+            self.device_removed(key, dev)
+            removed.append(key)
+        for key, fields in records.items():
+            dev = self.devices.get(key)
+            if dev is None:
+                self.devices[key] = dev = Device(*fields)
+                dev.key = key
+                added.append(key)
+            elif dev.fields() != fields:
+                dev.ip, dev.name, dev.mac, dev.switch, dev.port, dev.vlan, dev.url = fields
+                changed.append(key)
+            else:
+                continue
+            self.device_changed(key, dev)
+        if added or removed or changed:
+            self.data_changed()
+        return added, removed, changed
+
+    @traced("load_xml")
+    def load_xml(self):
+        if not os.path.exists(self.xml_file):
+            return
+        try:
+            self.apply_xml(self.read_xml())
+        except ET.ParseError as e:
+            self.report_error("XML Error", str(e))
+
+    def load_state(self):
+        if self.store.created and os.path.exists(self.state_file):
+            self.import_json_state()
+        else:
+            self.apply_state(*self.store.load())
+        if not self.floors:
+            self.add_floor(self.default_floor, self.map_image_path)
+        if self.active_floor not in self.floors:
+            self.active_floor = next(iter(self.floors))
+
+    def import_json_state(self):
+        with open(self.state_file) as f:
+            st = json.load(f)
+        devices = {key: (data.get('groups', []), data.get('position'), None)
+                   for key, data in st.get('devices', {}).items()}
+        self.apply_state(st.get('groups', []), [], devices)
+        self.dirty.update(self.devices)
+        self.groups_dirty = True
+        self.save_state()
+
+    def apply_state(self, groups, floors, devices):
+        for g in groups:
+            self.groups[g] = Group(g)
+        for name, map_path in floors:
+            self.floors[name] = Floor(name, map_path)
+        for key, (gs, pos, floor) in devices.items():
+            if key in self.devices:
+                dev = self.devices[key]
+                dev.groups = set(gs)
+                if pos:
+                    self.set_position(dev, tuple(pos), floor or self.default_floor)
+                    self.device_changed(key, dev)
+        self.data_changed()
+
+    def add_floor(self, name, map_path):
+        self.floors[name] = Floor(name, map_path)
+        self.floors_dirty = True
+
+    def set_position(self, dev, pos, floor=None):
+        # keeps the per-floor partition in step with the device, and drops the
+        # cached filter matches: floor: terms depend on it
+        self.data_version += 1
+        if dev.floor in self.floors:
+            self.floors[dev.floor].keys.discard(dev.key)
+        dev.original_position = pos
+        dev.floor = floor if pos else None
+        if pos:
+            if floor not in self.floors:
+                self.add_floor(floor, self.map_image_path if floor == self.default_floor else None)
+            self.floors[floor].keys.add(dev.key)
+
+    def save_state(self):
+        # snapshot the dirty rows, the store writes them
+        rows = []
+        for k in self.dirty:
+            d = self.devices.get(k)
+            if d is None:
+                continue
+            x, y = d.original_position or (None, None)
+            rows.append((k, json.dumps(sorted(d.groups)), x, y, d.floor))
+        groups = list(self.groups) if self.groups_dirty else None
+        floors = [(f.name, f.map_path) for f in self.floors.values()] if self.floors_dirty else None
+        self.dirty = set()
+        self.groups_dirty = self.floors_dirty = False
+        if rows or groups is not None or floors is not None:
+            self.store.write(groups, floors, rows)
+
+    # ------------------------------------------------------------------
+    #  Filters
+    # ------------------------------------------------------------------
+    def parse_filters(self, txt):
+        return compile_filter(txt)
+
+    def matches_filter(self, dev, f):
+        return f(dev)
+
+    def data_changed(self):
+        # invalidates the cached filter match set
+        self.data_version += 1
+        self.update_monitor()
+
+    def filter_keys(self, txt):
+        # raises ValueError for a malformed filter
+        if self.filter_cache and self.filter_cache[:2] == (txt, self.data_version):
+            return self.filter_cache[2]
+        filt = self.parse_filters(txt)
+        keys = [k for k, d in self.devices.items() if self.matches_filter(d, filt)]
+        self.filter_cache = (txt, self.data_version, keys)
+        return keys
+
+    def placed(self, keys):
+        devs = (self.devices[k] for k in keys)
+        if self.all_floors:
+            return [dev for dev in devs if dev.original_position]
+        return [dev for dev in devs if dev.original_position and dev.floor == self.active_floor]
+
+    def floor_devices(self, name=None):
+        floor = self.floors.get(name or self.active_floor)
+        return [self.devices[k] for k in floor.keys] if floor else []
+
+    def key_of(self, dev):
+        return dev.key
+
+    # ------------------------------------------------------------------
+    #  Ping
+    # ------------------------------------------------------------------
+    def is_online(self, target):
+        """Return True if target (IP or hostname) is reachable."""
+        if not target:
+            return False
+
+        system = platform.system()
+        if system == "Windows":
+            cmd = ['ping', '-n', '1', '-w', '1000', target]
+        else:
+            cmd = ['ping', '-c', '1', '-W', '1', target]
+
+        try:
+            result = subprocess.call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if result == 0:
+                return True
+        except Exception:
+            pass
+
+        # Fallback: try TCP connect on common ports
+        for port in (80, 443, 22, 23, 9100):
+            try:
+                with socket.create_connection((target, port), timeout=1):
+                    return True
+            except (OSError, socket.gaierror):
+                continue
+        return False
+
+    def ping_devices(self, devs, workers=30):
+        # yields (dev, online) as probes complete
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.is_online, self.target_of(d)): d for d in devs}
+            for f in concurrent.futures.as_completed(futures):
+                yield futures[f], f.result()
+
+    def target_of(self, dev):
+        return dev.name if dev.vlan == '1088' else dev.ip
+
+    def probe(self, target):
+        # RTT includes the ping process start-up, good enough to compare over time
+        t0 = time.perf_counter()
+        if not self.is_online(target):
+            return None
+        return (time.perf_counter() - t0) * 1000
+
+    def monitor_targets(self):
+        return {key: self.target_of(dev) for key, dev in self.devices.items() if dev.original_position}
+
+    def update_monitor(self):
+        if self.monitor:
+            self.monitor.set_targets(self.monitor_targets())
+
+    # ------------------------------------------------------------------
+    #  Export
+    # ------------------------------------------------------------------
+    def write_export(self, path, devs):
+        with open(path, 'w') as f:
+            for d in devs:
+                f.write(f"{d.name or d.ip}: {d.ip}  groups: {', '.join(d.groups)}\n")
+
+    def snapshot_markers(self, devs):
+        # (x, y, colour) in original map coordinates; PIL colour names have no spaces
+        return [(*d.original_position, d.color.replace(' ', '')) for d in devs if d.original_position]
+
 # ----------------------------------------------------------------------
 #  Main application
 # ----------------------------------------------------------------------
-class NetworkMapper:
-    def __init__(self, root):
+class NetworkMapper(MapperCore):
+    def __init__(self, root, xml_file="network.xml", state_db="mapper_state.db", map_image_path="drawing.jpg",
+                 trace_file=None):
+        super().__init__(xml_file, state_db, map_image_path, trace_file)
         self.root = root
         self.root.title("Network Floorplan Mapper")
-        self.devices = {}          # key to Device
-        self.groups  = {}          # name to Group
-        self.xml_file = "network.xml"
-        self.map_image_path = "drawing.jpg"
-        self.state_file = "mapper_state.json"
 
         self.zoom_level = 1.0
         self.base_radius = 10
@@ -54,13 +906,37 @@ class NetworkMapper:
 
         self.current_dev = None    # device shown in side-panel
 
+        # Search: index of unplaced devices, debounced queries, paged results
+        self.search_index = SearchIndex()
+        self.search_delay = 150    # ms of typing silence before querying
+        self.search_page = 200     # rows inserted into the listbox per page
+        self.search_after = None
+        self.search_results = []
+        self.search_shown = 0
+
+        # Continuous monitoring (off until toggled)
+        self.monitor_queue = queue.Queue()
+        self.tooltip = None
+        self.hover_key = None
+
+        self.auto_save_timer = None   # pending save_state, 5 s after the last edit
+
         self.load_xml()
         self.load_state()
         self.setup_gui()
+        self.render = RenderScheduler(self.root, self.apply_render, tracer=self.tracer)
+        self.render.start()
         self.load_map_image()      # after canvas exists
         self.draw_devices()
+
+        # XML reloads: debounced on the observer side, applied on the Tk thread
+        self.reload_queue = queue.Queue()
+        self.reload_lock = Lock()
+        self.reload_timer = None
+        self.reload_delay = 0.5    # s of quiet after the last change event
+        self.observer = None       # set by setup_file_watcher
         self.setup_file_watcher()
-        self.auto_save_timer = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Ping queue for non-blocking UI
         self.ping_queue = queue.Queue()
@@ -68,6 +944,14 @@ class NetworkMapper:
         self.online = 0
         self.total_devs = 0
 
+        # Tracing: F12 toggles the overlay (and tracing, if not already on)
+        self.latency_interval = 100   # ms between event-loop latency probes
+        self.overlay_shown = False
+        self.root.bind("<F12>", self.toggle_trace_overlay)
+        self.root.after(self.latency_interval, self.probe_loop_latency, None)
+        if self.tracer.enabled:
+            self.toggle_trace_overlay()
+
     # ------------------------------------------------------------------
     #  GUI construction
     # ------------------------------------------------------------------
@@ -80,14 +964,29 @@ class NetworkMapper:
         side.pack(side=tk.LEFT, fill=tk.Y)
         side.pack_propagate(False)
 
+        # Floor
+        floor_row = tk.Frame(side, bg='#f0f0f0')
+        floor_row.pack(fill=tk.X, padx=10, pady=(5, 0))
+        tk.Label(floor_row, text="Floor:", bg='#f0f0f0').pack(side=tk.LEFT)
+        self.floor_cb = ttk.Combobox(floor_row, state='readonly', width=20)
+        self.floor_cb.pack(side=tk.LEFT, padx=5)
+        self.floor_cb.bind("<<ComboboxSelected>>", lambda e: self.switch_floor(self.floor_cb.get()))
+        tk.Button(floor_row, text="Add", width=5, command=self.add_floor_dialog).pack(side=tk.LEFT)
+        self.update_floor_list()
+
         # Search
         tk.Label(side, text="Search (IP/Name):", bg='#f0f0f0').pack(pady=5)
         self.search_entry = tk.Entry(side)
         self.search_entry.pack(fill=tk.X, padx=10)
-        self.search_entry.bind("<KeyRelease>", self.update_search_results)
-
-        self.search_lb = tk.Listbox(side, height=10)
-        self.search_lb.pack(fill=tk.X, padx=10, pady=5)
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+
+        search_frame = tk.Frame(side)
+        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        search_bar = tk.Scrollbar(search_frame, orient=tk.VERTICAL)
+        self.search_lb = tk.Listbox(search_frame, height=10, yscrollcommand=lambda a, b: self.on_search_scroll(search_bar, a, b))
+        search_bar.config(command=self.search_lb.yview)
+        search_bar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.search_lb.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.search_lb.bind("<<ListboxSelect>>", self.on_select_for_deploy)
 
         # Groups
@@ -105,8 +1004,9 @@ class NetworkMapper:
         self.filter_entry = tk.Entry(side)
         self.filter_entry.pack(fill=tk.X, padx=10)
         tk.Label(side,
-                 text="e.g. include shopfloor, exclude plc, name:printer, ips:192.168.1.11,192.168.1.12",
-                 bg='#f0f0f0', font=('Arial',8)).pack(padx=10)
+                 text="e.g. include shopfloor, exclude plc, name:printer*, ips:192.168.1.11;10.1.0.0/16, "
+                      "(switch:sw1 OR switch:sw2) AND NOT include spare",
+                 bg='#f0f0f0', font=('Arial',8), wraplength=300, justify=tk.LEFT).pack(padx=10)
 
         fbtns = tk.Frame(side, bg='#f0f0f0')
         fbtns.pack(pady=5)
@@ -116,6 +1016,14 @@ class NetworkMapper:
         tk.Button(fbtns, text="Export", width=8, command=self.export_filtered).pack(side=tk.LEFT, padx=2)
         tk.Button(fbtns, text="List",   width=8, command=self.show_online_offline).pack(side=tk.LEFT, padx=2)
 
+        self.all_floors_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(side, text="Filter / ping / export all floors", variable=self.all_floors_var,
+                       bg='#f0f0f0', command=lambda: setattr(self, 'all_floors', self.all_floors_var.get())
+                       ).pack(anchor='w', padx=10)
+        self.monitor_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(side, text="Monitor placed devices", variable=self.monitor_var,
+                       bg='#f0f0f0', command=self.toggle_monitor).pack(anchor='w', padx=10)
+
         # ---------- DEVICE INFO PANEL ----------
         info = tk.LabelFrame(side, text="Device Info", bg='#f0f0f0')
         info.pack(fill=tk.X, padx=10, pady=15)
@@ -159,6 +1067,10 @@ class NetworkMapper:
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.canvas.configure(xscrollcommand=hbar.set, yscrollcommand=vbar.set)
 
+        # trace overlay, floats over the canvas while shown
+        self.trace_overlay = tk.Label(canvas_frame, bg='black', fg='#7CFC00', font=('Courier', 8),
+                                      justify=tk.LEFT, anchor='nw')
+
         # bindings
         self.canvas.bind("<MouseWheel>", self.zoom)          # Windows / macOS
         self.canvas.bind("<Button-4>",   lambda e: self.zoom(e, 1.1))
@@ -174,18 +1086,63 @@ class NetworkMapper:
     #  Image handling
     # ------------------------------------------------------------------
     def load_map_image(self):
-        if not os.path.exists(self.map_image_path):
+        # only the active floor's image is held; the previous one is dropped
+        self.original_img = self.current_img = self.map_tk = None
+        path = self.floors[self.active_floor].map_path
+        if not path or not os.path.exists(path):
+            if self.image_id:
+                self.canvas.delete(self.image_id)
+                self.image_id = None
+            self.canvas.config(scrollregion=(0, 0, 0, 0))
             return
-        self.original_img = Image.open(self.map_image_path)
+        self.original_img = Image.open(path)
         self.current_img  = self.original_img.copy()
         self.map_tk = ImageTk.PhotoImage(self.current_img)
-        self.image_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.map_tk)
+        if self.image_id:
+            self.canvas.itemconfig(self.image_id, image=self.map_tk)
+        else:
+            self.image_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.map_tk)
+            self.canvas.tag_lower(self.image_id)
         w, h = self.original_img.size
         self.canvas.config(scrollregion=(0, 0, w, h))
 
+    # ------------------------------------------------------------------
+    #  Floors
+    # ------------------------------------------------------------------
+    def update_floor_list(self):
+        self.floor_cb.config(values=list(self.floors))
+        self.floor_cb.set(self.active_floor)
+
+    def switch_floor(self, name):
+        if name == self.active_floor or name not in self.floors:
+            return
+        self.canvas.delete('dev')                 # markers of the floor we leave
+        for dev in self.floor_devices():
+            dev.canvas_id = None
+        self.hide_tooltip()
+        self.clear_device_info()
+        self.active_floor = name
+        self.zoom_level = 1.0
+        self.load_map_image()
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.draw_devices()
+        self.update_floor_list()
+
+    def add_floor_dialog(self):
+        name = simpledialog.askstring("New Floor", "Floor name:")
+        if not name or name in self.floors:
+            return
+        path = filedialog.askopenfilename(title="Floor map image",
+                                          filetypes=[("Images", "*.jpg *.jpeg *.png *.gif *.bmp"), ("All", "*.*")])
+        self.add_floor(name, path or None)
+        self.schedule_save()
+        self.switch_floor(name)
+
     # ------------------------------------------------------------------
     #  Zoom (mouse-wheel centred on cursor)
     # ------------------------------------------------------------------
+    @traced("zoom")
     def zoom(self, event, factor=None):
         if not self.original_img:
             return
@@ -219,72 +1176,78 @@ class NetworkMapper:
     # ------------------------------------------------------------------
     #  XML / State
     # ------------------------------------------------------------------
-    def get_text(self, parent, tag, default=''):
-        el = parent.find(tag)
-        return el.text.strip() if el is not None and el.text else default
+    def report_error(self, title, msg):
+        messagebox.showerror(title, msg)
 
-    def load_xml(self):
-        if not os.path.exists(self.xml_file):
-            return
-        try:
-            tree = ET.parse(self.xml_file)
-            root = tree.getroot()
-            for dev_el in root.findall('device'):
-                ip   = self.get_text(dev_el, 'ip')
-                name = self.get_text(dev_el, 'name')
-                mac  = self.get_text(dev_el, 'mac')
-                sw   = self.get_text(dev_el, 'switch')
-                port = self.get_text(dev_el, 'port')
-                vlan = self.get_text(dev_el, 'vlan')
-                url  = self.get_text(dev_el, 'url')
-
-                key = name if name else ip
-                if not key:
-                    key = mac if mac else f"unk_{len(self.devices)}"
-                while key in self.devices:
-                    key += "_dup"
-
-                if key not in self.devices:
-                    self.devices[key] = Device(ip, name, mac, sw, port, vlan, url)
-                else:
-                    d = self.devices[key]
-                    d.ip, d.name, d.mac, d.switch, d.port, d.vlan, d.url = ip, name, mac, sw, port, vlan, url
-        except ET.ParseError as e:
-            messagebox.showerror("XML Error", str(e))
+    def device_changed(self, key, dev):
+        self.search_index.sync(key, dev)
 
-    def load_state(self):
-        if not os.path.exists(self.state_file):
-            return
-        with open(self.state_file) as f:
-            st = json.load(f)
-        for g in st.get('groups', []):
-            self.groups[g] = Group(g)
-        for key, data in st.get('devices', {}).items():
-            if key in self.devices:
-                dev = self.devices[key]
-                dev.groups = set(data.get('groups', []))
-                pos = data.get('position')
-                if pos:
-                    dev.original_position = tuple(pos)
+    def device_removed(self, key, dev):
+        if dev.canvas_id:
+            self.canvas.delete(dev.canvas_id)
+        if dev is self.current_dev:
+            self.clear_device_info()
+        self.search_index.remove(key)
 
     def save_state(self):
-        st = {
-            "groups": list(self.groups.keys()),
-            "devices": {}
-        }
-        for k, d in self.devices.items():
-            st["devices"][k] = {
-        "groups": list(d.groups),
-        "position": list(d.original_position) if d.original_position else None
-            }
-        with open(self.state_file, 'w') as f:
-            json.dump(st, f)
-
-    def schedule_save(self):
+        self.auto_save_timer = None
+        super().save_state()
+
+    def schedule_save(self, keys=(), groups=False):
+        self.dirty.update(keys)
+        self.groups_dirty = self.groups_dirty or groups     # floors_dirty is set by add_floor
+        if self.auto_save_timer:
+            self.root.after_cancel(self.auto_save_timer)
+        self.auto_save_timer = self.root.after(5000, self.save_state)
+
+    def on_close(self):
         if self.auto_save_timer:
-            self.auto_save_timer.cancel()
-        self.auto_save_timer = Timer(5.0, self.save_state)
-        self.auto_save_timer.start()
+            self.root.after_cancel(self.auto_save_timer)
+        if self.monitor:
+            self.monitor.stop()
+            self.monitor = None
+        if self.observer:
+            self.observer.stop()
+        with self.reload_lock:
+            if self.reload_timer:
+                self.reload_timer.cancel()
+        if self.observer:
+            self.observer.join()
+        self.save_state()
+        self.store.close()
+        if self.trace_file:
+            self.tracer.write(self.trace_file)
+        self.root.destroy()
+
+    # ------------------------------------------------------------------
+    #  Tracing overlay / event-loop latency
+    # ------------------------------------------------------------------
+    def probe_loop_latency(self, expected):
+        # how late the Tk loop runs a callback that was due `expected`
+        now = time.perf_counter()
+        if expected is not None and self.tracer.enabled:
+            self.tracer.counter("tk.latency", max(0.0, (now - expected) * 1000))
+        self.root.after(self.latency_interval, self.probe_loop_latency, now + self.latency_interval / 1000)
+
+    def toggle_trace_overlay(self, _=None):
+        self.overlay_shown = not self.overlay_shown
+        if not self.overlay_shown:
+            self.trace_overlay.place_forget()
+            if not self.trace_file:
+                self.tracer.enabled = False
+            return
+        self.tracer.enabled = True
+        self.trace_overlay.place(x=5, y=5)
+        self.update_trace_overlay()
+
+    def update_trace_overlay(self):
+        if not self.overlay_shown:
+            return
+        lines = [f"{'handler':<22}{'last':>8}{'p95':>8}{'n':>7}"]
+        for name, (last, p95, n) in sorted(self.tracer.stats().items()):
+            lines.append(f"{name:<22}{last:>8.1f}{p95:>8.1f}{n:>7}")
+        self.trace_overlay.config(text="\n".join(lines))
+        self.root.after(500, self.update_trace_overlay)
 
     # ------------------------------------------------------------------
     #  File watcher (XML changes)
@@ -293,27 +1256,85 @@ class NetworkMapper:
         class Handler(FileSystemEventHandler):
             def __init__(self, app):
                 self.app = app
+                self.path = os.path.abspath(app.xml_file)
             def on_modified(self, ev):
-                if ev.src_path == os.path.abspath(self.app.xml_file):
-                    self.app.load_xml()
-                    self.app.draw_devices()
-                    messagebox.showinfo("Update", "network.xml changed – reloaded")
-        obs = Observer()
-        obs.schedule(Handler(self), path=os.path.dirname(os.path.abspath(self.xml_file)))
-        obs.start()
+                if ev.src_path == self.path:
+                    self.app.xml_changed()
+            on_created = on_modified
+            def on_moved(self, ev):        # editors that save via rename
+                if ev.dest_path == self.path:
+                    self.app.xml_changed()
+        self.observer = Observer()
+        self.observer.schedule(Handler(self), path=os.path.dirname(os.path.abspath(self.xml_file)))
+        self.observer.start()
+        self.root.after(250, self.process_reload_queue)
+
+    def xml_changed(self):
+        # observer thread: coalesce the burst of events a single save produces
+        with self.reload_lock:
+            if self.reload_timer:
+                self.reload_timer.cancel()
+            self.reload_timer = Timer(self.reload_delay, self.reload_xml)
+            self.reload_timer.daemon = True
+            self.reload_timer.start()
+
+    def reload_xml(self):
+        # timer thread: parse off the Tk thread, the UI picks the result up
+        try:
+            self.reload_queue.put(('ok', self.read_xml()))
+        except (ET.ParseError, OSError) as e:
+            self.reload_queue.put(('error', str(e)))
+
+    def process_reload_queue(self):
+        latest = None
+        try:
+            while True:
+                status, payload = self.reload_queue.get_nowait()
+                if status == 'error':
+                    messagebox.showerror("XML Error", payload)
+                else:
+                    latest = payload       # only the newest parse matters
+        except queue.Empty:
+            pass
+        if latest is not None:
+            with self.tracer.span("reload.apply"):
+                added, removed, changed = self.apply_xml(latest)
+                for key in added + changed:
+                    self.render.post(key)
+            if added or removed or changed:
+                self.update_search_results()
+                messagebox.showinfo("Update", f"network.xml changed – {len(added)} added, "
+                                              f"{len(removed)} removed, {len(changed)} changed")
+        self.root.after(250, self.process_reload_queue)
 
     # ------------------------------------------------------------------
     #  Search / Deploy
     # ------------------------------------------------------------------
+    def schedule_search(self, _=None):
+        # debounce: only query once typing pauses
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(self.search_delay, self.update_search_results)
+
+    @traced("update_search_results")
     def update_search_results(self, _=None):
-        q = self.search_entry.get().lower()
+        self.search_after = None
+        self.search_results = self.search_index.query(self.search_entry.get())
+        self.search_shown = 0
         self.search_lb.delete(0, tk.END)
-        for key, dev in self.devices.items():
-            if dev.original_position:               # already placed to skip
-                continue
-            s = f"{key} {dev.ip or ''} {dev.name or ''}".lower()
-            if q in s:
-                self.search_lb.insert(tk.END, key)
+        self.show_more_results()
+
+    def show_more_results(self):
+        page = self.search_results[self.search_shown:self.search_shown + self.search_page]
+        if page:
+            self.search_lb.insert(tk.END, *page)
+            self.search_shown += len(page)
+
+    def on_search_scroll(self, bar, first, last):
+        bar.set(first, last)
+        # next page once the user scrolls to the bottom
+        if float(last) >= 1.0 and self.search_shown < len(self.search_results):
+            self.root.after_idle(self.show_more_results)
 
     def on_select_for_deploy(self, _=None):
         sel = self.search_lb.curselection()
@@ -329,6 +1350,8 @@ class NetworkMapper:
                     self.groups[g] = Group(g)
                 dev.groups.add(g)
             self.update_groups_list()
+            self.data_changed()
+            self.schedule_save([key], groups=True)
 
         # start dragging to place
         self.dragging = dev
@@ -399,11 +1422,15 @@ class NetworkMapper:
             # Clean temporary circle
             if self.dragging.canvas_id:
                 self.canvas.delete(self.dragging.canvas_id)
+                self.dragging.canvas_id = None
 
-            self.dragging.original_position = (cx, cy)
-            self.draw_device(self.dragging, self.key_of(self.dragging))
+            self.set_position(self.dragging, (cx, cy), self.active_floor)
+            key = self.key_of(self.dragging)
+            self.search_index.remove(key)
+            self.draw_device(self.dragging, key)
             self.dragging = None
-            self.schedule_save()
+            self.update_monitor()
+            self.schedule_save([key])
         else:
             # Just a click to show info
             if self.selected_key:
@@ -414,43 +1441,99 @@ class NetworkMapper:
         self.selected_key = None
 
     def on_hover(self, ev):
-        item = self.canvas.find_closest(ev.x, ev.y)[0]
+        item = self.canvas.find_closest(self.canvas.canvasx(ev.x), self.canvas.canvasy(ev.y))[0]
         tags = self.canvas.gettags(item)
+        dev = None
         if tags and tags[0].startswith('dev:'):
-            key = tags[0][4:]
-            dev = self.devices.get(key)
-            if dev:
-                self.root.title(f"Mapper – {dev.name or dev.ip}")
-            else:
-                self.root.title("Mapper")
+            dev = self.devices.get(tags[0][4:])
+        if dev:
+            self.root.title(f"Mapper – {dev.name or dev.ip}")
+            self.hover_key = tags[0][4:]
+            self.show_tooltip(ev.x_root, ev.y_root)
         else:
             self.root.title("Mapper")
+            self.hover_key = None
+            self.hide_tooltip()
 
     # ------------------------------------------------------------------
-    #  Drawing
+    #  Hover tooltip with probe history sparkline
     # ------------------------------------------------------------------
-    def key_of(self, dev):
-        for k, d in self.devices.items():
-            if d is dev: return k
-        return None
+    def show_tooltip(self, x=None, y=None):
+        dev = self.devices.get(self.hover_key)
+        if not dev or not dev.history:
+            self.hide_tooltip()
+            return
+        if self.tooltip is None:
+            self.tooltip = tk.Toplevel(self.root)
+            self.tooltip.overrideredirect(True)
+            self.tip_label = tk.Label(self.tooltip, bg='#ffffe0', font=('Arial', 8), justify=tk.LEFT)
+            self.tip_label.pack(fill=tk.X)
+            self.tip_canvas = tk.Canvas(self.tooltip, width=128, height=32, bg='white', highlightthickness=0)
+            self.tip_canvas.pack()
+        samples = dev.history.recent()
+        last = samples[-1]
+        status = f"{last:.0f} ms" if last >= 0 else "no reply"
+        self.tip_label.config(text=f"{dev.name or dev.ip}\nlast: {status}")
+        self.draw_sparkline(self.tip_canvas, samples, 128, 32)
+        if x is not None:
+            self.tooltip.geometry(f"+{x + 15}+{y + 10}")
+        self.tooltip.deiconify()
+
+    def hide_tooltip(self):
+        if self.tooltip is not None:
+            self.tooltip.withdraw()
+
+    def draw_sparkline(self, cv, samples, w, h):
+        cv.delete('all')
+        peak = max([s for s in samples if s >= 0] + [1.0])
+        step = w / max(len(samples) - 1, 1)
+        pts = []
+        for i, s in enumerate(samples):
+            x = i * step
+            if s < 0:                       # no reply: red tick, break the line
+                cv.create_line(x, h - 10, x, h, fill='red')
+                if len(pts) > 2: cv.create_line(*pts, fill='green')
+                pts = []
+            else:
+                pts += [x, h - 2 - (h - 4) * s / peak]
+        if len(pts) > 2:
+            cv.create_line(*pts, fill='green')
 
+    # ------------------------------------------------------------------
+    #  Drawing
+    # ------------------------------------------------------------------
+    @traced("draw_devices")
     def draw_devices(self):
-        for key, dev in self.devices.items():
-            self.draw_device(dev, key)
+        for dev in self.floor_devices():
+            self.render.post(dev.key)
+
+    def apply_render(self, key, color):
+        # RenderScheduler callback, Tk thread
+        dev = self.devices.get(key)
+        if dev is None:
+            return
+        if color is not None:
+            dev.color = color
+        self.draw_device(dev, key)
 
     def draw_device(self, dev, key):
-        if dev.canvas_id:
-            self.canvas.delete(dev.canvas_id)
-        if not dev.original_position:
+        if not dev.original_position or dev.floor != self.active_floor:
+            if dev.canvas_id:
+                self.canvas.delete(dev.canvas_id)
+                dev.canvas_id = None
             return
         ox, oy = dev.original_position
         x = ox * self.zoom_level
         y = oy * self.zoom_level
         r = self.base_radius * self.zoom_level
+        if dev.canvas_id:                    # move / recolour in place
+            self.canvas.coords(dev.canvas_id, x-r, y-r, x+r, y+r)
+            self.canvas.itemconfigure(dev.canvas_id, fill=dev.color)
+            return
         dev.canvas_id = self.canvas.create_oval(
             x-r, y-r, x+r, y+r,
             fill=dev.color,
-            tags=f'dev:{key}'
+            tags=(f'dev:{key}', 'dev')
         )
 
     # ------------------------------------------------------------------
@@ -484,7 +1567,8 @@ class NetworkMapper:
         if not self.current_dev: return
         txt = self.groups_entry.get()
         self.current_dev.groups = {g.strip() for g in txt.split(',') if g.strip()}
-        self.schedule_save()
+        self.data_changed()
+        self.schedule_save([self.key_of(self.current_dev)])
         messagebox.showinfo("Saved", "Groups updated")
 
     def delete_device(self):
@@ -492,10 +1576,13 @@ class NetworkMapper:
         if not messagebox.askyesno("Delete", "Remove this device from the map?"):
             return
         self.canvas.delete(self.current_dev.canvas_id)
-        self.current_dev.original_position = None
+        self.set_position(self.current_dev, None)
         self.current_dev.canvas_id = None
         self.current_dev.color = 'blue'
-        self.schedule_save()
+        key = self.key_of(self.current_dev)
+        self.search_index.sync(key, self.current_dev)
+        self.update_monitor()
+        self.schedule_save([key])
         self.clear_device_info()
 
     # ------------------------------------------------------------------
@@ -506,17 +1593,21 @@ class NetworkMapper:
         if name and name not in self.groups:
             self.groups[name] = Group(name)
             self.update_groups_list()
-            self.schedule_save()
+            self.schedule_save(groups=True)
 
     def delete_group(self):
         sel = self.groups_lb.curselection()
         if not sel: return
         name = self.groups_lb.get(sel[0])
         del self.groups[name]
-        for dev in self.devices.values():
-            dev.groups.discard(name)
+        touched = []
+        for key, dev in self.devices.items():
+            if name in dev.groups:
+                dev.groups.discard(name)
+                touched.append(key)
         self.update_groups_list()
-        self.schedule_save()
+        self.data_changed()
+        self.schedule_save(touched, groups=True)
 
     def update_groups_list(self):
         self.groups_lb.delete(0, tk.END)
@@ -526,85 +1617,52 @@ class NetworkMapper:
     # ------------------------------------------------------------------
     #  Filters
     # ------------------------------------------------------------------
-    def parse_filters(self, txt):
-        parts = [p.strip() for p in txt.split(',')]
-        f = {'inc':[], 'exc':[], 'name':[], 'switch':[], 'ips':[]}
-        for p in parts:
-            if p.startswith('include '):  f['inc'].append(p[8:].strip())
-            elif p.startswith('exclude '): f['exc'].append(p[8:].strip())
-            elif p.startswith('name:'):    f['name'].append(p[5:].strip())
-            elif p.startswith('switch:'): f['switch'].append(p[7:].strip())
-            elif p.startswith('ips:'):     f['ips'].extend([i.strip() for i in p[4:].split(';')])
-        return f
-
-    def matches_filter(self, dev, f):
-        if f['inc'] and not any(g in dev.groups for g in f['inc']): return False
-        if any(g in dev.groups for g in f['exc']): return False
-        if f['name'] and (dev.name or '').lower() not in [n.lower() for n in f['name']]: return False
-        if f['switch'] and (dev.switch or '').lower() not in [s.lower() for s in f['switch']]: return False
-        if f['ips'] and (dev.ip or '').lower() not in [i.lower() for i in f['ips']]: return False
-        return True
+    def filtered_keys(self):
+        # None after reporting a malformed filter
+        try:
+            return self.filter_keys(self.filter_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Filter Error", str(e))
+            return None
 
+    @traced("apply_filter")
     def apply_filter(self):
-        txt = self.filter_entry.get()
-        filt = self.parse_filters(txt)
+        keys = self.filtered_keys()
+        if keys is None:
+            return
         self.clear_colors(exclude=['green','red'])
-        for key, dev in self.devices.items():
-            if self.matches_filter(dev, filt):
-                dev.color = 'dark violet'
-                self.draw_device(dev, key)
+        for key in keys:
+            dev = self.devices[key]
+            dev.color = 'dark violet'
+            if dev.original_position:
+                self.render.post(key, dev.color)    # replaces a pending ping colour
 
     def clear_filter(self):
         self.clear_colors()
         for key, dev in self.devices.items():
             if dev.original_position:
                 dev.color = 'blue'
-                self.draw_device(dev, key)
+                self.render.post(key, dev.color)
 
     def clear_colors(self, exclude=None):
         if exclude is None: exclude = []
-        for dev in self.devices.values():
+        for key, dev in self.devices.items():
             if dev.color not in exclude:
                 dev.color = 'blue'
                 if dev.original_position:
-                    self.draw_device(dev, self.key_of(dev))
+                    self.render.post(key, dev.color)
 
     def get_filtered(self):
-        filt = self.parse_filters(self.filter_entry.get())
-        return [dev for dev in self.devices.values() if self.matches_filter(dev, filt) and dev.original_position]
+        keys = self.filtered_keys()
+        return None if keys is None else self.placed(keys)
 
     # ------------------------------------------------------------------
     #  Ping – FIXED (non-blocking UI)
     # ------------------------------------------------------------------
-    def is_online(self, target):
-        """Return True if target (IP or hostname) is reachable."""
-        if not target:
-            return False
-
-        system = platform.system()
-        if system == "Windows":
-            cmd = ['ping', '-n', '1', '-w', '1000', target]
-        else:
-            cmd = ['ping', '-c', '1', '-W', '1', target]
-
-        try:
-            result = subprocess.call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if result == 0:
-                return True
-        except Exception:
-            pass
-
-        # Fallback: try TCP connect on common ports
-        for port in (80, 443, 22, 23, 9100):
-            try:
-                with socket.create_connection((target, port), timeout=1):
-                    return True
-            except (OSError, socket.gaierror):
-                continue
-        return False
-
     def ping_filtered(self):
         devs = self.get_filtered()
+        if devs is None:
+            return
         if not devs:
             messagebox.showinfo("Ping", "No devices match the filter.")
             return
@@ -613,54 +1671,83 @@ class NetworkMapper:
         self.total_devs = len(devs)
 
         def worker():
-            with concurrent.futures.ThreadPoolExecutor(max_workers=30) as pool:
-                futures = {}
-                for dev in devs:
-                    target = dev.name if dev.vlan == '1088' else dev.ip
-                    futures[pool.submit(self.is_online, target)] = dev
-                for f in concurrent.futures.as_completed(futures):
-                    dev = futures[f]
-                    color = 'green' if f.result() else 'red'
-                    self.ping_queue.put((dev, color))
-            self.ping_queue.put(None)  # end signal
+            online = 0
+            for dev, up in self.ping_devices(devs):
+                online += up
+                self.render.post(dev.key, 'green' if up else 'red')
+            self.ping_queue.put(online)  # end signal
 
         self.ping_thread = Thread(target=worker, daemon=True)
         self.ping_thread.start()
         self.root.after(100, self.process_ping_queue)
 
     def process_ping_queue(self):
+        # colours arrive through the render scheduler, only the summary comes here
+        try:
+            self.online = self.ping_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.process_ping_queue)
+            return
+        messagebox.showinfo("Ping", f"{self.online}/{self.total_devs} online")
+
+    # ------------------------------------------------------------------
+    #  Continuous monitoring
+    # ------------------------------------------------------------------
+    def toggle_monitor(self):
+        if self.monitor_var.get():
+            self.monitor = Monitor(self.probe, self.monitor_queue)
+            self.monitor.set_targets(self.monitor_targets())
+            self.monitor.start()
+            self.root.after(250, self.process_monitor_queue, self.monitor)
+        elif self.monitor:
+            self.monitor.stop()
+            self.monitor = None
+
+    def process_monitor_queue(self, monitor):
+        if self.monitor is not monitor:      # switched off (or restarted) since
+            return
+        results = []
         try:
             while True:
-                item = self.ping_queue.get_nowait()
-                if item is None:
-                    messagebox.showinfo("Ping", f"{self.online}/{self.total_devs} online")
-                    return
-                dev, color = item
-                dev.color = color
-                self.draw_device(dev, self.key_of(dev))
-                if color == 'green':
-                    self.online += 1
+                results.append(self.monitor_queue.get_nowait())
         except queue.Empty:
             pass
-        self.root.after(100, self.process_ping_queue)
+        if results:
+            self.apply_monitor_results(results)
+        self.root.after(250, self.process_monitor_queue, monitor)
+
+    @traced("monitor.results")
+    def apply_monitor_results(self, results):
+        for key, rtt in results:
+            dev = self.devices.get(key)
+            if not dev or not dev.original_position:
+                continue
+            if dev.history is None:
+                dev.history = ProbeHistory()
+            dev.history.add(rtt)
+            self.render.post(key, 'green' if rtt is not None else 'red')
+            if key == self.hover_key:
+                self.show_tooltip()
 
     # ------------------------------------------------------------------
     #  Export / List
     # ------------------------------------------------------------------
     def export_filtered(self):
         devs = self.get_filtered()
+        if devs is None:
+            return
         if not devs:
             messagebox.showinfo("Export", "Nothing to export.")
             return
         path = filedialog.asksaveasfilename(defaultextension=".txt")
         if path:
-            with open(path, 'w') as f:
-                for d in devs:
-                    f.write(f"{d.name or d.ip}: {d.ip}  groups: {', '.join(d.groups)}\n")
+            self.write_export(path, devs)
             messagebox.showinfo("Export", "Done")
 
     def show_online_offline(self):
         devs = self.get_filtered()
+        if devs is None:
+            return
         if not devs:
             messagebox.showinfo("List", "No filtered devices.")
             return
@@ -672,7 +1759,100 @@ class NetworkMapper:
 # ----------------------------------------------------------------------
 #  Run
 # ----------------------------------------------------------------------
-if __name__ == "__main__":
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Network floorplan mapper. Opens the GUI unless --headless is given.")
+    p.add_argument("--headless", action="store_true", help="Filter / ping / export without creating a window.")
+    p.add_argument("--xml", default="network.xml", help="Device inventory (default network.xml).")
+    p.add_argument("--state", default="mapper_state.db", help="State database (default mapper_state.db).")
+    p.add_argument("--filter", "-f", default="", help="Filter text, same syntax as the Filters box (default: all).")
+    p.add_argument("--ping", action="store_true", help="Probe the filtered devices and print a summary.")
+    p.add_argument("--list", action="store_true", help="Print online / offline devices (implies --ping).")
+    p.add_argument("--export", "-o", help="Write the filtered devices to this file.")
+    p.add_argument("--workers", type=int, default=30, help="Parallel probes (default 30).")
+    p.add_argument("--floor", help="Only devices placed on this floor (default: all floors).")
+    p.add_argument("--snapshot", metavar="DIR", help="Render the filtered devices onto the map as PNG tiles in DIR "
+                                                     "(DIR/<floor> per floor when several floors are rendered).")
+    p.add_argument("--map", help="Map image: of a new state's default floor in the GUI (default drawing.jpg); "
+                                 "headless, of --floor, or of the active floor without it.")
+    p.add_argument("--zooms", default="1", help="Comma-separated tile zoom levels, empty for none (default 1).")
+    p.add_argument("--tile-size", type=int, default=256, help="Tile edge in pixels (default 256).")
+    p.add_argument("--single-width", type=int, help="Also write DIR/floorplan.png downscaled to this width.")
+    p.add_argument("--timing", action="store_true", help="Print startup and load times to stderr.")
+    p.add_argument("--trace", metavar="FILE", help="Record handler timings and write them as Chrome trace JSON on exit.")
+    return p.parse_args(argv)
+
+def run_headless(args):
+    core = MapperCore(args.xml, args.state, args.map or "drawing.jpg", args.trace)
+    try:
+        return headless_tasks(core, args)
+    finally:
+        # the writer must finish, or a first run leaves a half-imported database
+        core.store.close()
+        if args.trace:
+            core.tracer.write(args.trace)
+
+def headless_tasks(core, args):
+    t_ready = time.perf_counter()
+    core.load_xml()
+    core.load_state()
+    t_loaded = time.perf_counter()
+    if args.floor and args.floor not in core.floors:
+        core.report_error("Floor Error", f"No floor named '{args.floor}'")
+        return 2
+    core.active_floor = args.floor or core.active_floor
+    core.all_floors = not args.floor
+    if args.map:
+        core.floors[core.active_floor].map_path = args.map   # this run only, not saved
+    if args.timing:
+        print(f"startup {(t_ready - T_START) * 1000:.1f} ms, load {(t_loaded - t_ready) * 1000:.1f} ms "
+              f"({len(core.devices)} devices)", file=sys.stderr)
+
+    try:
+        devs = core.placed(core.filter_keys(args.filter))
+    except ValueError as e:
+        core.report_error("Filter Error", str(e))
+        return 2
+
+    if args.ping or args.list:
+        online = 0
+        for dev, up in core.ping_devices(devs, args.workers):
+            dev.color = 'green' if up else 'red'
+            online += up
+        print(f"{online}/{len(devs)} online")
+    if args.list:
+        print(f"Online: {', '.join(d.name or d.ip for d in devs if d.color == 'green')}")
+        print(f"Offline: {', '.join(d.name or d.ip for d in devs if d.color == 'red')}")
+    if args.export:
+        core.write_export(args.export, devs)
+        print(f"Exported {len(devs)} devices to {args.export}")
+    if args.snapshot:
+        from snapshot import SnapshotExporter
+        zooms = [float(z) for z in args.zooms.split(',') if z.strip()]
+        floors = [core.floors[args.floor]] if args.floor else list(core.floors.values())
+        missing = [f.name for f in floors if not f.map_path or not os.path.exists(f.map_path)]
+        if args.floor and missing:
+            core.report_error("Snapshot Error", f"Floor '{args.floor}' has no map image (give one with --map)")
+            return 2
+        floors = [f for f in floors if f.name not in missing]
+        for floor in floors:
+            out_dir = args.snapshot if len(floors) == 1 else os.path.join(args.snapshot, floor.name)
+            exporter = SnapshotExporter(floor.map_path, out_dir, zooms, args.tile_size,
+                                        single_width=args.single_width)
+            n = exporter.export(core.snapshot_markers([d for d in devs if d.floor == floor.name]))
+            print(f"Snapshot: {n} images updated in {out_dir}")
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.headless:
+        return run_headless(args)
+    load_gui()
     root = tk.Tk()
-    app = NetworkMapper(root)
+    NetworkMapper(root, args.xml, args.state, args.map or "drawing.jpg", args.trace)
+    if args.timing:
+        print(f"startup {(time.perf_counter() - T_START) * 1000:.1f} ms", file=sys.stderr)
     root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+bench_mapper.py
+
+Usage:
+    python bench_mapper.py                          # core benchmarks, 1k / 10k / 100k devices
+    python bench_mapper.py --gui -o results.json    # also canvas benchmarks (starts Xvfb if no DISPLAY)
+    xvfb-run -a python bench_mapper.py --gui --sizes 1000,20000 --repeat 5
+
+Generates synthetic inventories (network.xml, legacy mapper_state.json and,
+for --gui, a large floorplan image) and times the mapper's hot paths on them:
+
+    core:  load_xml, import_json_state, load_state, save_state (+ flush to disk),
+           search keystrokes, filter apply (cold compile), ping drain (stub probe)
+    gui:   startup, first draw, search keystrokes (incl. listbox), filter apply,
+           zoom step, full redraw, ping drain through the render scheduler
+
+Drawing is timed until the render scheduler has nothing pending and Tk has
+processed its idle tasks, i.e. until the change is on screen.
+
+Results are JSON (min / median / max ms per benchmark and size) together with
+the Python version, platform and git commit, so runs can be diffed over time.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import zlib
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+from threading import Thread
+
+import app
+from app import MapperCore, StateStore, SearchIndex, compile_filter
+
+KINDS = ("pc", "printer", "plc", "cam", "ap", "phone")
+GROUPS = ("shopfloor", "office", "spare", "lab", "warehouse")
+VLANS = ("10", "20", "30", "1088")
+FILTERS = (
+    "include shopfloor",
+    "exclude spare, name:printer*",
+    "ips:10.0.0.0/20;10.1.*",
+    "(switch:sw1 OR switch:sw2*) AND NOT include spare",
+)
+
+# ------------------------------
+# Synthetic data
+# ------------------------------
+def device_name(i):
+    return f"{KINDS[i % len(KINDS)]}-{i:06d}"
+
+def gen_xml(path, n):
+    with open(path, "w") as f:
+        f.write("<devices>\n")
+        for i in range(n):
+            f.write(f"<device><ip>10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}</ip>"
+                    f"<name>{device_name(i)}</name><mac>02:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:"
+                    f"{i & 255:02x}:00</mac><switch>sw{i % 64}</switch><port>{i % 48 + 1}</port>"
+                    f"<vlan>{VLANS[i % len(VLANS)]}</vlan><url>http://{device_name(i)}.local</url></device>\n")
+        f.write("</devices>\n")
+
+def gen_state_json(path, n, placed, size, rng):
+    # legacy state file: the mapper imports it into SQLite on first load
+    w, h = size
+    devices = {}
+    for i in range(n):
+        data = {"groups": rng.sample(GROUPS, rng.randint(0, 2))}
+        if rng.random() < placed:
+            data["position"] = [round(rng.uniform(0, w), 1), round(rng.uniform(0, h), 1)]
+        devices[device_name(i)] = data
+    with open(path, "w") as f:
+        json.dump({"groups": list(GROUPS), "devices": devices}, f)
+
+def gen_map(path, size):
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for x in range(0, w, 200):          # rooms / corridors, enough detail for a realistic JPEG
+        draw.line((x, 0, x, h), fill=(90, 90, 90), width=3)
+    for y in range(0, h, 150):
+        draw.line((0, y, w, y), fill=(150, 150, 150), width=1)
+    img.save(path, quality=85)
+
+def make_dataset(root, n, args, rng):
+    d = os.path.join(root, str(n))
+    os.makedirs(d, exist_ok=True)
+    paths = {"xml": os.path.join(d, "network.xml"),
+             "db": os.path.join(d, "mapper_state.db"),
+             "json": os.path.join(d, "mapper_state.json"),
+             "map": os.path.join(d, "drawing.jpg")}
+    gen_xml(paths["xml"], n)
+    gen_state_json(paths["json"], n, args.placed, args.map_size, rng)
+    if args.gui and not os.path.exists(paths["map"]):
+        gen_map(paths["map"], args.map_size)
+    return paths
+
+def remove_db(path):
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+# ------------------------------
+# Stub probe and timing helpers
+# ------------------------------
+class StubProbe:
+    """is_online without the network: ~90 % up, optional fixed latency."""
+    probe_delay = 0.0
+
+    def is_online(self, target):
+        if self.probe_delay:
+            time.sleep(self.probe_delay)
+        return zlib.crc32(target.encode()) % 10 != 0
+
+class BenchCore(StubProbe, MapperCore):
+    pass
+
+def summary(times):
+    ms = [t * 1000 for t in times]
+    return {"min": round(min(ms), 3), "median": round(statistics.median(ms), 3),
+            "max": round(max(ms), 3), "n": len(ms)}
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+def keystrokes(n):
+    # typing a device name, one query per character
+    return [device_name(n // 2)[:i] for i in range(1, len(device_name(n // 2)) + 1)]
+
+# ------------------------------
+# Core benchmarks (no display)
+# ------------------------------
+def loaded_core(paths):
+    core = BenchCore(paths["xml"], paths["db"], paths["map"])
+    core.load_xml()
+    core.load_state()
+    return core
+
+def bench_core(paths, n, args):
+    res = {}
+
+    times = []
+    for _ in range(args.repeat):
+        core = BenchCore(paths["xml"], paths["db"], paths["map"])
+        times.append(timed(core.load_xml))
+        core.store.close()
+    res["load_xml"] = summary(times)
+
+    times = []
+    for _ in range(args.repeat):
+        remove_db(paths["db"])
+        core = BenchCore(paths["xml"], paths["db"], paths["map"])
+        core.load_xml()
+        times.append(timed(core.load_state))
+        core.store.close()              # the imported rows reach the database here
+    res["import_json_state"] = summary(times)
+
+    times = []
+    for _ in range(args.repeat):
+        core = BenchCore(paths["xml"], paths["db"], paths["map"])
+        core.load_xml()
+        times.append(timed(core.load_state))
+        core.store.close()
+    res["load_state"] = summary(times)
+
+    # save_state is the Tk-thread part, flush includes the writer thread's commit
+    core = loaded_core(paths)
+    save, flush = [], []
+    for _ in range(args.repeat):
+        core.dirty.update(core.devices)
+        core.groups_dirty = core.floors_dirty = True
+        t0 = time.perf_counter()
+        core.save_state()
+        save.append(time.perf_counter() - t0)
+        core.store.close()
+        flush.append(time.perf_counter() - t0)
+        core.store = StateStore(core.state_db)
+    res["save_state"] = summary(save)
+    res["save_state_flush"] = summary(flush)
+
+    index = SearchIndex()
+    for key, dev in core.devices.items():
+        index.sync(key, dev)
+    times = []
+    for _ in range(args.repeat):
+        times.extend(timed(index.query, q) for q in keystrokes(n))
+    res["search_keystroke"] = summary(times)
+
+    times = []
+    for _ in range(args.repeat):
+        for txt in FILTERS:
+            compile_filter.cache_clear()
+            core.filter_cache = None
+            times.append(timed(core.filter_keys, txt))
+    res["filter_apply"] = summary(times)
+
+    core.all_floors = True
+    devs = core.placed(core.devices)
+    times = []
+    for _ in range(args.repeat):
+        times.append(timed(lambda: sum(up for _, up in core.ping_devices(devs, args.workers))))
+    res["ping_drain"] = summary(times)
+    res["placed"] = len(devs)
+    core.store.close()
+    return res
+
+# ------------------------------
+# GUI benchmarks (needs a display, real or virtual)
+# ------------------------------
+class Event:
+    def __init__(self, x, y, delta=0):
+        self.x, self.y, self.delta = x, y, delta
+
+def bench_gui(paths, n, args):
+    class BenchMapper(StubProbe, app.NetworkMapper):
+        def setup_file_watcher(self):
+            pass                        # no reloads during a run
+
+    def settle(m):
+        # pump the event loop until the render scheduler has drawn everything
+        while m.render.pending:
+            m.root.update()
+        m.root.update_idletasks()
+
+    res = {}
+    root = app.tk.Tk()
+    root.geometry("1600x1000")
+    t0 = time.perf_counter()
+    m = BenchMapper(root, paths["xml"], paths["db"], paths["map"])
+    root.update_idletasks()
+    res["startup"] = summary([time.perf_counter() - t0])
+    res["first_draw"] = summary([timed(settle, m)])
+    try:
+        times = []
+        for _ in range(args.repeat):
+            for q in keystrokes(n):
+                m.search_entry.delete(0, app.tk.END)
+                m.search_entry.insert(0, q)
+                times.append(timed(m.update_search_results))
+        res["search_keystroke"] = summary(times)
+
+        times = []
+        for _ in range(args.repeat):
+            for txt in FILTERS:
+                compile_filter.cache_clear()
+                m.filter_cache = None
+                m.filter_entry.delete(0, app.tk.END)
+                m.filter_entry.insert(0, txt)
+                times.append(timed(lambda: (m.apply_filter(), settle(m))))
+        res["filter_apply"] = summary(times)
+
+        times = []
+        ev = Event(800, 500)
+        for i in range(args.repeat * 2):
+            times.append(timed(lambda: (m.zoom(ev, 1.25 if i % 2 == 0 else 0.8), settle(m))))
+        res["zoom_step"] = summary(times)
+
+        times = []
+        for _ in range(args.repeat):
+            times.append(timed(lambda: (m.draw_devices(), settle(m))))
+        res["full_redraw"] = summary(times)
+
+        # as ping_filtered, minus the closing message box
+        devs = m.floor_devices()
+        def ping():
+            done = []
+            def worker():
+                for dev, up in m.ping_devices(devs, args.workers):
+                    m.render.post(dev.key, 'green' if up else 'red')
+                done.append(True)
+            Thread(target=worker, daemon=True).start()
+            while not done or m.render.pending:
+                root.update()
+            root.update_idletasks()
+        times = [timed(ping) for _ in range(args.repeat)]
+        res["ping_drain"] = summary(times)
+    finally:
+        m.on_close()
+    return res
+
+def start_xvfb():
+    # first free display number; the server lives as long as this process
+    for num in range(99, 120):
+        if os.path.exists(f"/tmp/.X{num}-lock"):
+            continue
+        proc = subprocess.Popen(["Xvfb", f":{num}", "-screen", "0", "1920x1080x24", "-nolisten", "tcp"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            if os.path.exists(f"/tmp/.X11-unix/X{num}"):
+                os.environ["DISPLAY"] = f":{num}"
+                return proc
+            time.sleep(0.1)
+        proc.terminate()
+    raise RuntimeError("could not start Xvfb")
+
+# ------------------------------
+# Main
+# ------------------------------
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Synthetic-data benchmarks for app.py.")
+    p.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated device counts.")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per benchmark (default 3).")
+    p.add_argument("--placed", type=float, default=0.3, help="Fraction of devices placed on the map (default 0.3).")
+    p.add_argument("--map-size", default="8000x6000", help="Synthetic map size WxH (default 8000x6000).")
+    p.add_argument("--gui", action="store_true", help="Also run the canvas benchmarks (Xvfb is started if no DISPLAY).")
+    p.add_argument("--workers", type=int, default=30, help="Parallel probes for the ping drain (default 30).")
+    p.add_argument("--probe-ms", type=float, default=0.0, help="Stub probe latency in ms (default 0).")
+    p.add_argument("--seed", type=int, default=1, help="Random seed for the synthetic state.")
+    p.add_argument("--workdir", help="Where to generate the data (default: a temporary directory, removed after).")
+    p.add_argument("--output", "-o", help="Write the JSON results here (default stdout).")
+    args = p.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.map_size = tuple(int(v) for v in args.map_size.lower().split("x"))
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    StubProbe.probe_delay = args.probe_ms / 1000
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_mapper_")
+    xvfb = None
+    if args.gui:
+        if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+            xvfb = start_xvfb()
+        app.load_gui()
+
+    out = {"meta": {"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                    "python": platform.python_version(), "platform": platform.platform(),
+                    "repeat": args.repeat, "placed": args.placed, "map_size": list(args.map_size),
+                    "probe_ms": args.probe_ms, "workers": args.workers},
+           "results": {}}
+    try:
+        for n in args.sizes:
+            print(f"{n} devices ...", file=sys.stderr)
+            paths = make_dataset(workdir, n, args, random.Random(args.seed))
+            remove_db(paths["db"])
+            res = {"core": bench_core(paths, n, args)}
+            if args.gui:
+                res["gui"] = bench_gui(paths, n, args)
+            out["results"][str(n)] = res
+    finally:
+        if xvfb:
+            xvfb.terminate()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(out, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+capture_archive.py
+
+Scan captures, sharded by day and indexed in SQLite, for gui.py.
+
+Layout (root):
+    YYYY-MM-DD/<code>.jpg       first capture of a code
+    YYYY-MM-DD/<code>_<n>.jpg   n-th repeat of the same code
+    YYYY-MM-DD/<...>.mp4        clip of that capture, when clips are on
+    captures.db                 index: code, repeat number, time, file, cameras, sizes
+
+Names come from a per-code counter in the index, so allocating one is a
+single indexed lookup no matter how many repeats exist. Lookups by code or
+time range use the index instead of listing directories, and old captures
+are pruned by age and/or total size (clips included, and deleted with
+their still), optionally from a background thread.
+Nothing is created until the first save or lookup, so an unreachable root
+fails those (with OSError / sqlite3.Error) rather than the caller's start-up.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def safe_name(code):
+    # scan codes end up in file names
+    return UNSAFE.sub("_", code).strip(" .") or "_"
+
+
+def clip_of(path):
+    # a capture's clip sits next to its still
+    return os.path.splitext(path)[0] + ".mp4"
+
+
+class CaptureArchive:
+    def __init__(self, root, ext=".jpg"):
+        self.root = root
+        self.ext = ext
+        self.lock = threading.Lock()  # one connection, shared by the saver threads
+        self.con = None               # opened on first use
+        self.stop_event = threading.Event()
+        self.pruner = None
+
+    def db(self):
+        # with self.lock held; retried on the next call if it fails
+        if self.con is None:
+            os.makedirs(self.root, exist_ok=True)
+            con = sqlite3.connect(os.path.join(self.root, "captures.db"), check_same_thread=False)
+            try:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute("PRAGMA synchronous=NORMAL")
+                con.execute("CREATE TABLE IF NOT EXISTS captures (code TEXT, seq INTEGER, ts REAL, path TEXT, "
+                            "cameras TEXT, size INTEGER, PRIMARY KEY (code, seq))")
+                if "clip" not in [c[1] for c in con.execute("PRAGMA table_info(captures)")]:
+                    con.execute("ALTER TABLE captures ADD COLUMN clip INTEGER DEFAULT 0")   # clip bytes
+                con.execute("CREATE INDEX IF NOT EXISTS captures_ts ON captures (ts)")
+                con.execute("CREATE INDEX IF NOT EXISTS captures_path ON captures (path)")
+                con.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT PRIMARY KEY, next INTEGER)")
+            except sqlite3.Error:
+                con.close()
+                raise
+            self.con = con
+        return self.con
+
+    # ------------------------------
+    # Saving
+    # ------------------------------
+    def allocate(self, code, when):
+        """Reserve the next name for code. Returns (seq, absolute path)."""
+        # counted per file stem: codes that sanitise alike share a counter
+        stem = safe_name(code)
+        with self.lock, self.db() as con:
+            row = con.execute("SELECT next FROM codes WHERE code = ?", (stem,)).fetchone()
+            seq = row[0] if row else 0
+            con.execute("INSERT OR REPLACE INTO codes VALUES (?, ?)", (stem, seq + 1))
+        day = when.strftime("%Y-%m-%d")
+        os.makedirs(os.path.join(self.root, day), exist_ok=True)
+        suffix = f"_{seq}" if seq else ""
+        return seq, os.path.join(self.root, day, f"{stem}{suffix}{self.ext}")
+
+    def record(self, code, seq, when, path, cameras, size):
+        with self.lock, self.db() as con:
+            con.execute("INSERT OR REPLACE INTO captures (code, seq, ts, path, cameras, size) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (code, seq, when.timestamp(), os.path.relpath(path, self.root),
+                         json.dumps(list(cameras)), size))
+
+    def record_clip(self, path):
+        """Count a finished clip, saved as <still>.mp4, towards the archive
+        size. Returns False if its still has been pruned in the meantime."""
+        still = os.path.relpath(os.path.splitext(path)[0] + self.ext, self.root)
+        size = os.path.getsize(path)
+        with self.lock, self.db() as con:
+            return con.execute("UPDATE captures SET clip = ? WHERE path = ?", (size, still)).rowcount > 0
+
+    # ------------------------------
+    # Lookup
+    # ------------------------------
+    def rows(self, where, args):
+        with self.lock:
+            cur = self.db().execute(f"SELECT code, seq, ts, path, cameras, size, clip FROM captures "
+                                    f"WHERE {where} ORDER BY ts", args)
+            return [{"code": code, "seq": seq, "time": datetime.fromtimestamp(ts),
+                     "path": os.path.join(self.root, path), "cameras": json.loads(cams), "size": size,
+                     "clip": clip_of(os.path.join(self.root, path)) if clip else None}
+                    for code, seq, ts, path, cams, size, clip in cur]
+
+    def find(self, code):
+        """All captures of a scan code, oldest first."""
+        return self.rows("code = ?", (code,))
+
+    def between(self, start, end):
+        """Captures with start <= time < end (datetimes), oldest first."""
+        return self.rows("ts >= ? AND ts < ?", (start.timestamp(), end.timestamp()))
+
+    # ------------------------------
+    # Retention
+    # ------------------------------
+    def prune(self, max_age_days=None, max_bytes=None):
+        """Delete captures older than max_age_days and, oldest first, until the
+        archive is at most max_bytes. Returns the number removed."""
+        cutoff = float("-inf")
+        if max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).timestamp()
+        with self.lock:
+            con = self.db()
+            doomed = con.execute("SELECT code, seq, path, size + clip FROM captures WHERE ts < ?",
+                                 (cutoff,)).fetchall()
+            if max_bytes is not None:
+                total = con.execute("SELECT COALESCE(SUM(size + clip), 0) FROM captures").fetchone()[0]
+                total -= sum(row[3] for row in doomed)
+                if total > max_bytes:
+                    for row in con.execute("SELECT code, seq, path, size + clip FROM captures "
+                                           "WHERE ts >= ? ORDER BY ts", (cutoff,)):
+                        if total <= max_bytes:
+                            break
+                        doomed.append(row)
+                        total -= row[3]
+            with con:
+                con.executemany("DELETE FROM captures WHERE code = ? AND seq = ?",
+                                [row[:2] for row in doomed])
+        # files outside the lock: saves carry on meanwhile
+        days = set()
+        for _, _, path, _ in doomed:
+            path = os.path.join(self.root, path)
+            for f in (path, clip_of(path)):   # the clip may not be indexed yet
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+            days.add(os.path.dirname(path))
+        for day in days:
+            try:
+                os.rmdir(os.path.join(self.root, day))   # only once empty
+            except OSError:
+                pass
+        return len(doomed)
+
+    def start_pruning(self, max_age_days=None, max_bytes=None, interval=3600):
+        if max_age_days is None and max_bytes is None:
+            return
+
+        def run():
+            while not self.stop_event.is_set():
+                try:
+                    self.prune(max_age_days, max_bytes)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[WARN] Archive pruning failed: {e}")
+                self.stop_event.wait(interval)
+
+        self.pruner = threading.Thread(target=run, daemon=True, name="archive-pruner")
+        self.pruner.start()
+
+    def close(self):
+        self.stop_event.set()
+        if self.pruner:
+            self.pruner.join()
+        with self.lock:
+            if self.con is not None:
+                self.con.close()
+                self.con = None
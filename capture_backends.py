@@ -0,0 +1,214 @@
+"""
+capture_backends.py
+
+Frame sources for gui.py, all with the cv2.VideoCapture-style interface the
+capture loop uses:
+
+    open() -> bool              negotiated settings in .negotiated
+    grab() -> bool              blocks until the next frame (or failure)
+    retrieve(buf=None)          (ok, frame), decoded into buf when it fits
+    release()
+
+Backends:
+    dshow       DirectShow camera by name (Windows)
+    v4l2        V4L2 device path or index (Linux)
+    file        video file, looped, paced to its own frame rate
+    synthetic   generated frames at a given size / rate, no hardware
+
+Cameras are given as a name (DirectShow, the old behaviour) or as a dict:
+    {"backend": "v4l2", "device": "/dev/video0", "width": 1280, "height": 720,
+     "fps": 30, "format": "MJPG"}
+"format" picks the FOURCC the camera sends: MJPG cuts USB bandwidth for
+high resolutions at some decode cost, YUY2 / raw avoids decoding.
+"""
+
+import time
+import zlib
+import cv2
+import numpy as np
+
+
+class OpenCVSource:
+    api = cv2.CAP_ANY
+
+    def __init__(self, device, width=None, height=None, fps=None, format=None, name=None):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.format = format
+        self.name = name or str(device)
+        self.cap = None
+        self.negotiated = {}
+
+    def target(self):
+        return self.device
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.target(), self.api)
+        if not self.cap.isOpened():
+            return False
+        # FOURCC before size: DirectShow picks the media type on the size change
+        if self.format:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.format))
+        if self.width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)     # newest frame, not a backlog
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.negotiated = {
+            "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self.cap.get(cv2.CAP_PROP_FPS),
+            "format": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\0") or None,
+        }
+        return True
+
+    def grab(self):
+        return self.cap.grab()
+
+    def retrieve(self, buf=None):
+        return self.cap.retrieve(buf)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class DirectShowSource(OpenCVSource):
+    api = cv2.CAP_DSHOW
+
+    def __init__(self, device, **kwargs):
+        super().__init__(device, **kwargs)
+        # resolved where the source is made (gui.py: the GUI thread, which has
+        # COM set up), not in the capture thread that opens it
+        self.index = dshow_index(device)
+
+    def target(self):
+        return f"video={self.device}" if self.index is None else self.index
+
+
+def dshow_index(name):
+    # DirectShow wants an index; resolve the friendly name through pygrabber.
+    # No pygrabber, a COM error or an unknown name: None, open by name instead
+    if isinstance(name, int):
+        return name
+    try:
+        from pygrabber.dshow_graph import FilterGraph
+        return FilterGraph().get_input_devices().index(name)
+    except Exception:
+        return None
+
+
+class V4L2Source(OpenCVSource):
+    api = cv2.CAP_V4L2
+
+
+class FileSource(OpenCVSource):
+    """A recording, looped and delivered in real time."""
+
+    def __init__(self, device, fps=None, loop=True, **kwargs):
+        super().__init__(device, fps=fps, **kwargs)
+        self.loop = loop
+        self.next_due = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.device)
+        if not self.cap.isOpened():
+            return False
+        self.fps = self.fps or self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.negotiated = {"width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                           "fps": self.fps, "format": "file"}
+        return True
+
+    def grab(self):
+        self.next_due = pace(self.next_due, self.fps)
+        if self.cap.grab():
+            return True
+        if not self.loop:
+            return False
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self.cap.grab()
+
+
+class SyntheticSource:
+    """Moving test pattern with a frame counter, for running and benchmarking
+    the station without cameras. Frames are cut from a pattern rendered once,
+    so producing one costs a copy into the caller's buffer."""
+
+    def __init__(self, device=None, width=1280, height=720, fps=30, format=None, name=None, **kwargs):
+        self.width = width or 1280
+        self.height = height or 720
+        self.fps = fps or 30
+        self.name = name or device or f"synthetic {self.width}x{self.height}@{self.fps:g}"
+        self.seed = zlib.crc32(self.name.encode()) & 0xFF
+        self.pattern = None
+        self.count = 0
+        self.next_due = None
+        self.negotiated = {}
+
+    def open(self):
+        w, h = self.width, self.height
+        x = np.arange(2 * w, dtype=np.int32)
+        y = np.arange(h, dtype=np.int32)[:, None]
+        self.pattern = np.empty((h, 2 * w, 3), np.uint8)
+        self.pattern[..., 0] = (x * 255 // w + self.seed) & 0xFF
+        self.pattern[..., 1] = (y * 255 // h) & 0xFF
+        self.pattern[..., 2] = ((x // 64 + y // 64) % 2 * 96 + self.seed) & 0xFF
+        self.pattern[:, w:] = self.pattern[:, :w]     # seamless wrap while scrolling
+        self.negotiated = {"width": w, "height": h, "fps": self.fps, "format": "synthetic"}
+        return True
+
+    def grab(self):
+        self.next_due = pace(self.next_due, self.fps)
+        self.count += 1
+        return True
+
+    def retrieve(self, buf=None):
+        w, h = self.width, self.height
+        if buf is None or buf.shape != (h, w, 3):
+            buf = np.empty((h, w, 3), np.uint8)
+        off = (self.count * 8) % w
+        np.copyto(buf, self.pattern[:, off:off + w])
+        cv2.putText(buf, f"{self.name} #{self.count}", (20, h - 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        return True, buf
+
+    def release(self):
+        self.pattern = None
+
+
+def pace(due, fps):
+    # sleep until the next frame is due; a late frame resets the schedule
+    # instead of bursting to catch up, like a camera dropping frames
+    now = time.perf_counter()
+    if due is None or due < now - 1.0 / fps:
+        return now + 1.0 / fps
+    if due > now:
+        time.sleep(due - now)
+    return due + 1.0 / fps
+
+
+BACKENDS = {
+    "dshow": DirectShowSource,
+    "v4l2": V4L2Source,
+    "file": FileSource,
+    "synthetic": SyntheticSource,
+}
+
+
+def make_source(spec, default_backend="dshow", **defaults):
+    """Source for a camera entry: a device name or a dict (see module doc)."""
+    if isinstance(spec, str):
+        spec = {"device": spec}
+    opts = dict(defaults)
+    opts.update(spec)
+    backend = opts.pop("backend", default_backend)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown capture backend: {backend}")
+    return BACKENDS[backend](**opts)
@@ -1,4 +1,12 @@
 import json
+import time
+import asyncio
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from pinger import build_ping_command
 
 # -------------------------------
 # DEVICE CLASS
@@ -9,20 +17,26 @@ class Device:
         self.mac = mac
         self.vlan = vlan
         self.tags = set()  # store tags like "vlan10", "vendor_AAA", "printer"
+        self.rtt = None    # ms, set by the reachability probe when online
+        self.probed = False
 
     # Runs all check modules on this device
+    # (for large inventories see run_checks_parallel below)
     def run_checks(self, checks):
         for check in checks:
             check.apply(self)
 
     # Convert to dict for JSON export
     def to_dict(self):
-        return {
+        data = {
             "ip": self.ip,
             "mac": self.mac,
             "vlan": self.vlan,
             "tags": sorted(list(self.tags))
         }
+        if self.probed:
+            data["rtt_ms"] = self.rtt
+        return data
 
 # -------------------------------
 # CHECK MODULES
@@ -56,18 +70,256 @@ class DeviceTypeCheck:
         else:
             device.tags.add("UnknownType")
 
+# -------------------------------
+# PARALLEL CHECK DRIVER
+# -------------------------------
+# Runs the checks on chunks of the device list in a process pool. The input
+# columns (ip, mac, vlan) and the output tag bitmaps live in shared memory,
+# so nothing is pickled per device: workers get a row range and return only
+# their chunk's tag vocabulary (bit -> tag name).
+#
+# Checks must be picklable (module-level classes) and report only through
+# device.tags. IPs / MACs must be strings or None, VLANs ints or None;
+# anything else runs serially. None is carried in a null-flag column, so
+# checks see exactly what the serial path would.
+# Rows whose chunk uses more than max_tags distinct tags come back as
+# plain tag lists instead of bits.
+VLAN_NONE = -(2 ** 63)
+IP_NONE, MAC_NONE = 1, 2        # null flags
+
+def _attach(name):
+    # the parent owns (and unlinks) the block; workers only map it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)   # shares the parent's resource tracker
+
+_worker = {}
+
+def _init_worker(in_name, out_name, n, ip_w, mac_w, words, max_tags, checks):
+    shm_in, shm_out = _attach(in_name), _attach(out_name)
+    buf = shm_in.buf
+    _worker.update(
+        shms=(shm_in, shm_out),
+        ips=buf[:n * ip_w],
+        macs=buf[n * ip_w:n * (ip_w + mac_w)],
+        vlans=buf[n * (ip_w + mac_w):n * (ip_w + mac_w + 8)].cast("q"),
+        nulls=buf[n * (ip_w + mac_w + 8):n * (ip_w + mac_w + 9)],
+        out=shm_out.buf.cast("Q"),
+        ip_w=ip_w, mac_w=mac_w, words=words, max_tags=max_tags, checks=checks,
+    )
+
+def _run_chunk(lo, hi):
+    w = _worker
+    ips, macs, vlans, nulls, out = w["ips"], w["macs"], w["vlans"], w["nulls"], w["out"]
+    ip_w, mac_w, words, max_tags, checks = w["ip_w"], w["mac_w"], w["words"], w["max_tags"], w["checks"]
+    vocab = {}                  # tag -> bit, in order of first use: same input, same bits
+    overflow = {}               # row -> tags, when the chunk runs out of bits
+    for i in range(lo, hi):
+        vlan, null = vlans[i], nulls[i]
+        device = Device(None if null & IP_NONE else bytes(ips[i * ip_w:(i + 1) * ip_w]).rstrip(b"\0").decode(),
+                        None if null & MAC_NONE else bytes(macs[i * mac_w:(i + 1) * mac_w]).rstrip(b"\0").decode(),
+                        None if vlan == VLAN_NONE else vlan)
+        device.run_checks(checks)
+        mask = [0] * words
+        for tag in device.tags:
+            bit = vocab.setdefault(tag, len(vocab))
+            if bit >= max_tags:
+                overflow[i] = sorted(device.tags)
+                mask = [0] * words
+                break
+            mask[bit >> 6] |= 1 << (bit & 63)
+        out[i * words:(i + 1) * words] = array("Q", mask)
+    return lo, hi, list(vocab), overflow
+
+def run_checks_parallel(devices, checks, workers=None, chunk_size=50000, max_tags=256):
+    devices = list(devices)
+    n = len(devices)
+    if n < 2 * chunk_size or not all((d.vlan is None or type(d.vlan) is int)
+                                     and (d.ip is None or type(d.ip) is str)
+                                     and (d.mac is None or type(d.mac) is str) for d in devices):
+        for d in devices:           # not worth a pool (or not packable)
+            d.run_checks(checks)
+        return devices
+
+    ips = [(d.ip or "").encode() for d in devices]
+    macs = [(d.mac or "").encode() for d in devices]
+    ip_w = max(1, max(map(len, ips)))
+    mac_w = max(1, max(map(len, macs)))
+    words = (max_tags + 63) // 64
+
+    shm_in = shared_memory.SharedMemory(create=True, size=n * (ip_w + mac_w + 9))
+    shm_out = shared_memory.SharedMemory(create=True, size=n * words * 8)
+    try:
+        buf = shm_in.buf
+        buf[:n * ip_w] = b"".join(ip.ljust(ip_w, b"\0") for ip in ips)
+        buf[n * ip_w:n * (ip_w + mac_w)] = b"".join(mac.ljust(mac_w, b"\0") for mac in macs)
+        vlans = buf[n * (ip_w + mac_w):n * (ip_w + mac_w + 8)].cast("q")
+        vlans[:] = array("q", [VLAN_NONE if d.vlan is None else d.vlan for d in devices])
+        vlans.release()
+        buf[n * (ip_w + mac_w + 8):n * (ip_w + mac_w + 9)] = bytes(
+            (IP_NONE if d.ip is None else 0) | (MAC_NONE if d.mac is None else 0) for d in devices)
+        del ips, macs, buf
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm_in.name, shm_out.name, n, ip_w, mac_w,
+                                           words, max_tags, checks)) as pool:
+            chunks = [pool.submit(_run_chunk, lo, min(n, lo + chunk_size))
+                      for lo in range(0, n, chunk_size)]
+            results = [f.result() for f in chunks]
+
+        # merge in row order; rows with the same bits share one decoded tag set
+        out = shm_out.buf.cast("Q")
+        try:
+            _merge(devices, results, out, words, max_tags)
+        finally:
+            out.release()
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+    return devices
+
+def _merge(devices, results, out, words, max_tags):
+    for lo, hi, vocab, overflow in results:
+        vocab = vocab[:max_tags]    # tags past max_tags only appear in overflow rows
+        decoded = {}
+        for i in range(lo, hi):
+            if i in overflow:
+                devices[i].tags.update(overflow[i])
+                continue
+            mask = tuple(out[i * words:(i + 1) * words])
+            tags = decoded.get(mask)
+            if tags is None:
+                tags = decoded[mask] = [tag for bit, tag in enumerate(vocab)
+                                        if mask[bit >> 6] >> (bit & 63) & 1]
+            devices[i].tags.update(tags)
+
+# -------------------------------
+# TAGGING PIPELINE
+# -------------------------------
+# Yields devices one at a time as they are tagged, so later stages
+# (probing, export) can start before the whole inventory is processed
+def tag_devices(rows, checks):
+    for ip, mac, vlan in rows:
+        device = Device(ip, mac, vlan)
+        device.run_checks(checks)
+        yield device
+
+# -------------------------------
+# REACHABILITY ENRICHMENT
+# -------------------------------
+# Ping one device and tag it "online"/"offline" with the round trip
+# (includes the ping process start-up, good enough to compare devices)
+async def probe_device(device, timeout):
+    cmd = build_ping_command(device.ip, timeout)
+    start = time.perf_counter()
+    up = False
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=timeout + 2)
+            up = proc.returncode == 0
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+    except Exception:
+        pass
+    device.probed = True
+    device.rtt = round((time.perf_counter() - start) * 1000, 1) if up else None
+    device.tags.discard("offline" if up else "online")
+    device.tags.add("online" if up else "offline")
+    return device
+
+# Async generator: probes devices from any iterable (a list, or tag_devices()
+# still running) with at most `concurrency` pings in flight, and yields each
+# device as soon as its probe completes (completion order, not input order)
+async def probe_devices(devices, concurrency=200, timeout=2.0):
+    source = iter(devices)
+    done = asyncio.Queue(maxsize=concurrency * 2)
+    finished = object()
+
+    async def worker():
+        try:
+            for device in source:          # shared: each worker pulls the next device
+                await done.put(await probe_device(device, timeout))
+        finally:
+            await done.put(finished)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    running = len(workers)
+    try:
+        while running:
+            item = await done.get()
+            if item is finished:
+                running -= 1
+            else:
+                yield item
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for w in workers:                  # a failing tagger / worker is not swallowed
+            if not w.cancelled() and w.exception():
+                raise w.exception()
+
 # -------------------------------
 # JSON EXPORT FUNCTION
 # -------------------------------
+# Writes a JSON array one record at a time (same layout as json.dump
+# with indent=4), so records can be written as they are produced
+class JsonArrayWriter:
+    def __init__(self, filename):
+        self.f = open(filename, "w")
+        self.count = 0
+
+    def write(self, record):
+        text = json.dumps(record, indent=4).replace("\n", "\n    ")
+        self.f.write(("[\n    " if not self.count else ",\n    ") + text)
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "[]")
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def export_to_json(devices, filename="devices.json"):
-    data = [d.to_dict() for d in devices]
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+    with JsonArrayWriter(filename) as out:
+        for d in devices:
+            out.write(d.to_dict())
+
+# Tag + probe + export in one pass: records are written as probes complete
+def export_with_reachability(devices, filename="devices.json", concurrency=200, timeout=2.0):
+    async def run():
+        with JsonArrayWriter(filename) as out:
+            async for d in probe_devices(devices, concurrency, timeout):
+                out.write(d.to_dict())
+        return out.count
+    return asyncio.run(run())
 
 # -------------------------------
 # MAIN SCRIPT
 # -------------------------------
 if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Tag devices from firewall data and export them to JSON.")
+    p.add_argument("--ping", action="store_true", help="Also probe each device and tag it online/offline with RTT.")
+    p.add_argument("--concurrency", "-c", type=int, default=200, help="Parallel pings (default 200).")
+    p.add_argument("--timeout", "-t", type=float, default=2.0, help="Ping timeout in seconds (default 2.0).")
+    p.add_argument("--output", "-o", default="devices.json", help="Output file (default devices.json).")
+    p.add_argument("--workers", "-w", type=int, default=0,
+                   help="Run the checks in this many processes (0: in this process).")
+    args = p.parse_args()
+
     # Dummy firewall data (IP, MAC, VLAN)
     firewall_data = [
         ["192.168.1.10", "aa:aa:aa:aa:aa", 10],
@@ -75,18 +327,28 @@ if __name__ == "__main__":
         ["192.168.1.12", "cc:cc:cc:cc:cc", 10],
     ]
 
-    # Create Device objects from firewall data
-    devices = [Device(ip, mac, vlan) for ip, mac, vlan in firewall_data]
-
     # Create check module objects
     checks = [VlanCheck(), MacVendorCheck(), DeviceTypeCheck()]
 
-    # Run all checks on each device
-    for device in devices:
-        device.run_checks(checks)
+    if args.ping:
+        # Tagging, probing and writing overlap: nothing waits for a full pass
+        devices = []
+        def keep(stream):
+            for d in stream:
+                devices.append(d)
+                yield d
+        export_with_reachability(keep(tag_devices(firewall_data, checks)), args.output,
+                                 args.concurrency, args.timeout)
+    elif args.workers:
+        devices = run_checks_parallel([Device(ip, mac, vlan) for ip, mac, vlan in firewall_data],
+                                      checks, args.workers)
+        export_to_json(devices, args.output)
+    else:
+        # Create Device objects from firewall data and run all checks on each
+        devices = list(tag_devices(firewall_data, checks))
 
-    # Export the results to JSON
-    export_to_json(devices)
+        # Export the results to JSON
+        export_to_json(devices, args.output)
 
     print("JSON export completed. Devices and tags:")
     for device in devices:
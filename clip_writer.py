@@ -0,0 +1,73 @@
+"""
+clip_writer.py
+
+Encodes the pre/post-trigger clips of gui.py in a worker process, so video
+encoding never competes with the capture threads or the GUI for the GIL.
+
+A clip arrives as one track per camera: [(time, JPEG bytes)], sampled at a
+reduced rate and size. The tracks are laid side by side at a common height
+and played on one timeline: each output frame shows, per camera, the newest
+sample at or before that moment.
+"""
+
+import os
+
+
+def write_clip(path, tracks, fps, height=None, trigger=None):
+    """Write the stitched clip to path (mp4). height defaults to the
+    smallest camera's. Returns path, or None if there was nothing to write."""
+    import cv2
+    import numpy as np
+
+    tracks = [sorted(t, key=lambda s: s[0]) for t in tracks]
+    stamps = [s[0] for t in tracks for s in t]
+    if not stamps:
+        return None
+    start, end = min(stamps), max(stamps)
+
+    def raw(data):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    if height is None:
+        height = min(raw(t[0][1]).shape[0] for t in tracks if t)
+
+    def decode(data):
+        img = raw(data)
+        h, w = img.shape[:2]
+        if h != height:
+            img = cv2.resize(img, (max(1, round(w * height / h)), height), interpolation=cv2.INTER_AREA)
+        return img
+
+    # slot width per camera from its first sample; empty tracks get a 4:3 black slot
+    firsts = [decode(t[0][1]) if t else None for t in tracks]
+    widths = [f.shape[1] if f is not None else height * 4 // 3 for f in firsts]
+    width = sum(widths) + sum(widths) % 2            # most codecs want even sizes
+    height_out = height + height % 2
+    canvas = np.zeros((height_out, width, 3), np.uint8)
+    xs = [sum(widths[:i]) for i in range(len(widths))]
+
+    tmp = os.path.splitext(path)[0] + ".part.mp4"
+    writer = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height_out))
+    if not writer.isOpened():
+        raise IOError(f"Cannot open video writer for {path}")
+    try:
+        pos = [0] * len(tracks)
+        current = firsts
+        for k in range(int((end - start) * fps) + 1):
+            t = start + k / fps
+            for i, track in enumerate(tracks):
+                advanced = False
+                while pos[i] + 1 < len(track) and track[pos[i] + 1][0] <= t:
+                    pos[i] += 1
+                    advanced = True
+                if advanced:
+                    current[i] = decode(track[pos[i]][1])
+                if current[i] is not None:
+                    canvas[:height, xs[i]:xs[i] + current[i].shape[1]] = current[i][:, :widths[i]]
+            if trigger is not None and t >= trigger:
+                cv2.circle(canvas, (20, 20), 8, (0, 0, 255), -1)   # marks frames after the scan
+            writer.write(canvas)
+    finally:
+        writer.release()
+    os.replace(tmp, path)
+    return path
@@ -1,6 +1,12 @@
 import sys
 import os
 import time
+import json
+import argparse
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import cv2
 import numpy as np
 from datetime import datetime
@@ -9,69 +15,572 @@ from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton,
     QLineEdit, QVBoxLayout, QHBoxLayout, QMessageBox
 )
-from PySide6.QtCore import Qt, QThread, Signal
-from PySide6.QtGui import QImage, QPixmap
+from PySide6.QtCore import Qt, QObject, QThread, Signal, QTimer
+from PySide6.QtGui import QImage, QPainter
 
-from pygrabber.dshow_graph import FilterGraph
+from capture_archive import CaptureArchive, clip_of
+from capture_backends import make_source
+from clip_writer import write_clip
+from compose import Composer
 
 
 # ===================== CONFIG =====================
 
 SAVE_DIR = r"C:\temp"
 
+# Saving (background writer pool)
+SAVE_FORMAT = "jpg"        # jpg / png / webp
+SAVE_QUALITY = 90          # jpg / webp quality, 0-100
+SAVE_PNG_LEVEL = 3         # png compression, 0-9
+SAVE_SCALE = 1.0           # < 1.0 downscales the stitched image
+SAVE_WORKERS = 2
+SAVE_QUEUE = 8             # scans waiting or in progress before new ones are refused
+
+# Archive: SAVE_DIR/YYYY-MM-DD/<code>[_n].<ext>, indexed in SAVE_DIR/captures.db
+RETENTION_DAYS = None      # delete captures older than this (None or 0: keep)
+RETENTION_GB = None        # and/or keep the archive below this size (None or 0: no limit)
+
+# Scan synchronisation: each camera keeps its last RING_FRAMES frames
+# (1080p: ~6 MB each), a scan takes the one captured closest to
+# trigger time - SCAN_OFFSET (s; > 0 prefers frames from just before)
+RING_FRAMES = 8
+SCAN_OFFSET = 0.0
+
+# Clips: with CLIP_ENABLED each scan also saves <image>.mp4 covering
+# CLIP_PRE s before to CLIP_POST s after the trigger, all cameras side by side,
+# sampled at CLIP_FPS and CLIP_WIDTH px per camera. Buffered as JPEG in memory,
+# at most CLIP_MEMORY_MB over all cameras, raw samples waiting to be encoded
+# included (older samples are dropped first; up to a quarter may be raw).
+CLIP_ENABLED = False
+CLIP_PRE = 3.0
+CLIP_POST = 2.0
+CLIP_FPS = 10
+CLIP_WIDTH = 640
+CLIP_QUALITY = 70
+CLIP_MEMORY_MB = 256
+
+# Telemetry: HUD_KEY toggles the on-screen HUD; every METRICS_INTERVAL s a
+# JSON line per station goes to METRICS_LOG (None: no log)
+HUD_KEY = Qt.Key_F3
+METRICS_WINDOW = 240       # samples per rolling window
+METRICS_INTERVAL = 60
+METRICS_LOG = os.path.join(SAVE_DIR, "metrics.jsonl")
+
 # ⚠️ PUT YOUR CAMERA NAMES HERE (order = layout order)
-CAMERA_NAMES = [
+# A name opens a DirectShow camera with CAMERA_DEFAULTS; a dict picks the
+# backend and settings per camera, e.g.
+#   {"backend": "v4l2", "device": "/dev/video0", "width": 1920, "height": 1080, "format": "MJPG"}
+# (see capture_backends.py). `python gui.py --synthetic 4` runs without cameras.
+CAMERAS = [
     "USB Camera SN1234",
     "USB Camera SN5678",
 ]
 
+# None keeps the camera's default. MJPG lets USB 2 hubs carry several
+# 1080p streams; raw (YUY2) saves the decode when bandwidth allows.
+CAMERA_DEFAULTS = {"width": None, "height": None, "fps": None, "format": None}
+
 EXIT_KEY = (Qt.Key_Q, Qt.ControlModifier | Qt.ShiftModifier)
 
 # =================================================
 
 
-class CameraThread(QThread):
-    frame_ready = Signal(object)
+class RollingWindow:
+    """Last N samples in a preallocated array."""
+
+    def __init__(self, size=METRICS_WINDOW):
+        self.values = np.zeros(size)
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def stats(self):
+        # (mean, p95, max) or None while empty
+        n = min(self.count, len(self.values))
+        if not n:
+            return None
+        vals = self.values[:n].copy()
+        return float(vals.mean()), float(np.percentile(vals, 95)), float(vals.max())
+
+
+class CameraMetrics:
+    """Per-camera counters, written by the capture thread (frames, convert)
+    and the GUI thread (latency). Plain numbers: a torn read only skews one
+    HUD refresh."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.grabs = RollingWindow(window)     # grab times, for the frame rate
+        self.convert = RollingWindow(window)   # ms to scale + convert for display
+        self.latency = RollingWindow(window)   # ms from grab to painted
+        self.frames = 0
+        self.dropped = 0           # gaps in the camera's frame timing
+        self.skipped = 0           # converted, but replaced before the GUI painted it
+        self.interval = None       # s between frames at the negotiated rate
+        self.last = None
+
+    def frame(self, stamp):
+        if self.last is not None and self.interval:
+            missed = round((stamp - self.last) / self.interval) - 1
+            if missed > 0:
+                self.dropped += missed
+        self.last = stamp
+        self.frames += 1
+        self.grabs.add(stamp)
+
+    def fps(self):
+        g = self.grabs
+        n = min(g.count, len(g.values))
+        if n < 2:
+            return 0.0
+        newest = g.values[(g.count - 1) % len(g.values)]
+        oldest = g.values[g.count % len(g.values)] if g.count > n else g.values[0]
+        return (n - 1) / (newest - oldest) if newest > oldest else 0.0
+
+    def snapshot(self):
+        return {"fps": round(self.fps(), 1), "frames": self.frames, "dropped": self.dropped,
+                "skipped": self.skipped, "convert_ms": rounded(self.convert.stats()),
+                "latency_ms": rounded(self.latency.stats())}
+
+
+def rounded(stats):
+    return None if stats is None else [round(v, 2) for v in stats]
+
+
+class FrameRing:
+    """Preallocated ring of the last N frames of one camera with their
+    capture times. The capture thread reads straight into the next slot;
+    a scan copies out the slot closest to its trigger time. Slots being
+    copied are pinned so the writer skips them instead of tearing them."""
+
+    def __init__(self, size=RING_FRAMES):
+        self.size = max(2, size)      # one slot being written, at least one to read
+        self.lock = threading.Lock()
+        self.frames = None            # (size, h, w, 3) uint8, allocated on the first frame
+        self.stamps = np.zeros(self.size)  # perf_counter() at grab, 0 = empty / being written
+        self.head = -1                # newest complete slot
+        self.pinned = {}              # slot to number of readers
+
+    def reset(self, shape):
+        # first frame, or the camera changed format
+        with self.lock:
+            self.frames = np.empty((self.size,) + shape, np.uint8)
+            self.stamps[:] = 0
+            self.head = -1
+            self.pinned = {}          # pins on the old buffer are released into the old dict
+
+    def slot(self):
+        """Writer: (index, buffer) to capture the next frame into, or
+        (None, None) while scans have every slot pinned."""
+        with self.lock:
+            for k in range(1, self.size + 1):
+                i = (self.head + k) % self.size
+                if i not in self.pinned:
+                    self.stamps[i] = 0
+                    return i, self.frames[i]
+            return None, None
+
+    def commit(self, i, stamp):
+        with self.lock:
+            self.stamps[i] = stamp
+            self.head = i
+
+    def pick(self, t):
+        """Copy of the frame captured closest to t, and its time."""
+        with self.lock:
+            valid = np.flatnonzero(self.stamps)
+            if not valid.size:
+                return None, None
+            i = int(valid[np.argmin(np.abs(self.stamps[valid] - t))])
+            stamp = self.stamps[i]
+            frames, pinned = self.frames, self.pinned   # a reset swaps both
+            pinned[i] = pinned.get(i, 0) + 1
+        try:
+            return frames[i].copy(), stamp
+        finally:
+            with self.lock:
+                pinned[i] -= 1
+                if not pinned[i]:
+                    del pinned[i]
 
-    def __init__(self, device_name):
+
+class FrameMailbox:
+    """Single slot between a capture worker and the GUI: the worker
+    overwrites, the GUI takes the newest. Nothing queues up. Also tracks
+    which buffer the GUI holds, so the worker can recycle the others."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.item = None
+        self.taken = None             # shown by the view until the next take
+
+    def put(self, item):
+        """Returns True if this replaced a frame the GUI never took."""
+        with self.lock:
+            replaced = self.item is not None
+            self.item = item
+        return replaced
+
+    def take(self):
+        with self.lock:
+            item, self.item = self.item, None
+            if item is not None:
+                self.taken = item
+        return item
+
+    def spare(self, buffers):
+        # a buffer neither waiting in the slot nor on screen
+        with self.lock:
+            busy = [it[0] for it in (self.item, self.taken) if it is not None]
+            for buf in buffers:
+                if not any(buf is b for b in busy):
+                    return buf
+
+
+class CameraThread(QThread):
+    def __init__(self, source):
         super().__init__()
-        self.device_name = device_name
+        self.source = source
+        self.device_name = source.name
         self.running = True
-        self.last_frame = None
+        self.wake = threading.Event() # cuts the retry wait short on stop
+        self.ring = FrameRing()       # full resolution, for scans
+        self.mailbox = FrameMailbox() # display-ready RGB buffers
+        self.target_size = None       # (w, h, dpr) of the view, set from the GUI thread
+        self.display = None           # (target, scaled BGR, [3 RGB buffers])
+        self.metrics = CameraMetrics()
+        self.clip_sink = None         # ClipRecorder.offer(frame, stamp), when clips are on
+
+    def set_target_size(self, w, h, dpr):
+        self.target_size = (w, h, dpr)
+
+    def display_buffers(self, target, frame_shape):
+        # reallocated only when the view is resized
+        if self.display is None or self.display[0] != (target, frame_shape):
+            w, h, dpr = target
+            pw, ph = round(w * dpr), round(h * dpr)
+            scaled = None if frame_shape[:2] == (ph, pw) else np.empty((ph, pw, 3), np.uint8)
+            rgbs = [np.empty((ph, pw, 3), np.uint8) for _ in range(3)]
+            self.display = ((target, frame_shape), scaled, rgbs)
+        return self.display[1], self.display[2]
+
+    def to_display(self, frame, stamp):
+        # resize first, so the colour conversion only touches display pixels
+        t0 = time.perf_counter()
+        target = self.target_size
+        if target is None or target[0] <= 0 or target[1] <= 0:
+            return None
+        scaled, rgbs = self.display_buffers(target, frame.shape)
+        if scaled is not None:
+            interp = cv2.INTER_AREA if scaled.shape[1] < frame.shape[1] else cv2.INTER_LINEAR
+            cv2.resize(frame, (scaled.shape[1], scaled.shape[0]), dst=scaled, interpolation=interp)
+            frame = scaled
+        rgb = self.mailbox.spare(rgbs)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        ph, pw = rgb.shape[:2]
+        img = QImage(rgb.data, pw, ph, 3 * pw, QImage.Format_RGB888)
+        img.setDevicePixelRatio(target[2])
+        self.metrics.convert.add((time.perf_counter() - t0) * 1000)
+        return rgb, img, stamp        # the array owns the pixels the QImage points at
+
+    def capture(self, cap):
+        """Grab into the ring. Returns (frame, grab time) or (None, None)."""
+        if not cap.grab():
+            return None, None
+        stamp = time.perf_counter()   # grab time: closest to when the sensor saw it
+        if self.ring.frames is None:
+            ret, frame = cap.retrieve()
+            if not ret:
+                return None, None
+            self.ring.reset(frame.shape)
+            i, buf = self.ring.slot()
+            buf[...] = frame
+        else:
+            i, buf = self.ring.slot()
+            if buf is None:           # every slot pinned by scans: show it, keep it out of the ring
+                ret, frame = cap.retrieve()
+                return (frame, stamp) if ret else (None, None)
+            ret, frame = cap.retrieve(buf)
+            if not ret:
+                return None, None
+            if frame is not buf:      # format changed under us: re-size the ring
+                self.ring.reset(frame.shape)
+                i, buf = self.ring.slot()
+                buf[...] = frame
+        self.ring.commit(i, stamp)
+        self.metrics.frame(stamp)
+        return buf, stamp
 
     def run(self):
-        cap = cv2.VideoCapture(
-            f"video={self.device_name}",
-            cv2.CAP_DSHOW
-        )
-
-        if not cap.isOpened():
+        src = self.source
+        if not src.open():
             print(f"[ERROR] Cannot open {self.device_name}")
             return
+        print(f"[INFO] {self.device_name}: {src.negotiated}")
+        fps = src.negotiated.get("fps")
+        self.metrics.interval = 1.0 / fps if fps and fps > 0 else None
 
+        # grab() blocks until the camera delivers, so the loop runs at the
+        # camera's rate; only a failing camera waits before retrying
         while self.running:
-            ret, frame = cap.read()
-            if ret:
-                self.last_frame = frame
-                self.frame_ready.emit(frame)
-            time.sleep(0.01)
-
-        cap.release()
+            frame, stamp = self.capture(src)
+            if frame is None:
+                self.wake.wait(0.1)
+                continue
+            item = self.to_display(frame, stamp)
+            if item is not None and self.mailbox.put(item):
+                self.metrics.skipped += 1
+            if self.clip_sink:
+                self.clip_sink(frame, stamp)
+
+        src.release()
 
     def stop(self):
         self.running = False
+        self.wake.set()
         self.wait()
 
 
-class CameraView(QLabel):
-    def __init__(self):
+class CaptureSaver(QObject):
+    """Compose, encode and write scans on a small thread pool (cv2 releases
+    the GIL while encoding). At most SAVE_QUEUE scans are in flight, so a
+    slow disk shows up as a refused scan instead of growing memory."""
+    saved = Signal(str, str, float)  # code, path, ms from submit to on disk
+    failed = Signal(str, str)      # code, message
+    pending_changed = Signal(int)
+
+    def __init__(self, archive, fmt=SAVE_FORMAT, quality=SAVE_QUALITY, png_level=SAVE_PNG_LEVEL,
+                 scale=SAVE_SCALE, workers=SAVE_WORKERS, limit=SAVE_QUEUE):
+        super().__init__()
+        self.archive = archive
+        self.ext = "." + fmt.lower().lstrip(".")
+        if self.ext in (".jpg", ".jpeg"):
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif self.ext == ".webp":
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        elif self.ext == ".png":
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_level]
+        else:
+            raise ValueError(f"Unsupported save format: {fmt}")
+        self.composer = Composer(scale)
+        self.limit = limit
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="saver")
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, code, frames, cameras, when, done=None):
+        """Queue a scan. Returns False (and queues nothing) when full.
+        done(path or None) is called from the worker once the scan is over."""
+        with self.lock:
+            if self.pending >= self.limit:
+                return False
+            self.pending += 1
+            pending = self.pending
+        self.pending_changed.emit(pending)
+        self.pool.submit(self.run, code, frames, cameras, when, time.perf_counter(), done)
+        return True
+
+    def run(self, code, frames, cameras, when, t0, done):
+        path = None
+        try:
+            path = self.write(code, cameras, when, self.compose(frames, when))
+            self.saved.emit(code, path, (time.perf_counter() - t0) * 1000)
+        except PermissionError:
+            self.failed.emit(code, "No access to save location")
+        except OSError as e:
+            self.failed.emit(code, f"OS Error:\n{e}")
+        except Exception as e:
+            self.failed.emit(code, str(e))
+        finally:
+            with self.lock:
+                self.pending -= 1
+                pending = self.pending
+            self.pending_changed.emit(pending)
+            if done:
+                done(path)
+
+    def compose(self, frames, when):
+        # into this worker's preallocated canvas; encoded before it is reused
+        return self.composer.compose(frames, when.strftime("%d-%m-%Y %H:%M:%S"))
+
+    def write(self, code, cameras, when, img):
+        ok, buf = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            raise IOError("Failed to encode image")
+        seq, path = self.archive.allocate(code, when)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf)
+        os.replace(tmp, path)          # never a half-written image under the final name
+        self.archive.record(code, seq, when, path, cameras, len(buf))
+        return path
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class Clip:
+    def __init__(self, trigger):
+        self.trigger = trigger        # perf_counter() time of the scan
+        self.path = None
+        self.ready = False            # the still is saved (or failed: path stays None)
+
+
+class ClipRecorder(QObject):
+    """Pre/post-trigger clips. Capture threads hand in downscaled samples at
+    CLIP_FPS; the recorder thread JPEG-encodes them into per-camera buffers.
+    Once a clip's window has passed and its still is on disk, the samples go
+    to a worker process that encodes the video, so neither the preview nor
+    the capture threads wait on the encoder."""
+    clip_saved = Signal(str)
+    clip_failed = Signal(str)
+
+    def __init__(self, cameras, pre=CLIP_PRE, post=CLIP_POST, fps=CLIP_FPS, width=CLIP_WIDTH,
+                 quality=CLIP_QUALITY, memory_mb=CLIP_MEMORY_MB, archive=None):
+        super().__init__()
+        self.archive = archive        # finished clips count towards retention there
+        self.pre, self.post, self.fps = pre, post, fps
+        self.width = width
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.cap = memory_mb * 1024 * 1024
+        self.tracks = [deque() for _ in range(cameras)]   # (stamp, JPEG bytes)
+        self.bytes = 0
+        self.queued = 0               # bytes of raw samples waiting in self.samples
+        self.next_due = [0.0] * cameras
+        self.samples = queue.Queue(maxsize=max(4, 2 * cameras * fps))
+        self.lock = threading.Lock()
+        self.clips = []
+        self.pool = ProcessPoolExecutor(max_workers=1)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="clip-recorder")
+        self.thread.start()
+
+    def sink(self, cam):
+        return lambda frame, stamp: self.offer(cam, frame, stamp)
+
+    def offer(self, cam, frame, stamp):
+        # capture thread: a resize at CLIP_FPS, the encode happens elsewhere
+        if stamp < self.next_due[cam]:
+            return
+        self.next_due[cam] = stamp + 1.0 / self.fps
+        h, w = frame.shape[:2]
+        if w > self.width:
+            small = cv2.resize(frame, (self.width, round(h * self.width / w)), interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()
+        with self.lock:
+            if self.queued + small.nbytes > self.cap // 4:
+                return                # recorder behind: a gap in the clip, not a stall
+            self.queued += small.nbytes
+        try:
+            self.samples.put_nowait((cam, stamp, small))
+        except queue.Full:
+            with self.lock:
+                self.queued -= small.nbytes
+
+    def trigger(self, t):
+        clip = Clip(t)
+        with self.lock:
+            self.clips.append(clip)
+        return clip
+
+    def output(self, clip, image_path):
+        # saver thread: the clip is named after its still
+        with self.lock:
+            clip.path = clip_of(image_path) if image_path else None
+            clip.ready = True
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                cam, stamp, small = self.samples.get(timeout=0.1)
+                with self.lock:
+                    self.queued -= small.nbytes
+                ok, buf = cv2.imencode(".jpg", small, self.params)
+                if ok:
+                    self.tracks[cam].append((stamp, buf.tobytes()))
+                    self.bytes += len(buf)
+            except queue.Empty:
+                pass
+            self.finish(time.perf_counter())
+            self.evict(time.perf_counter())
+
+    def finish(self, now, force=False):
+        with self.lock:
+            due = [c for c in self.clips if c.ready and (force or now >= c.trigger + self.post)]
+            self.clips = [c for c in self.clips if c not in due]
+        for clip in due:
+            if not clip.path:
+                continue
+            lo, hi = clip.trigger - self.pre, clip.trigger + self.post
+            tracks = [[s for s in track if lo <= s[0] <= hi] for track in self.tracks]
+            fut = self.pool.submit(write_clip, clip.path, tracks, self.fps, None, clip.trigger)
+            fut.add_done_callback(lambda f, path=clip.path: self.done(f, path))
+
+    def done(self, fut, path):
+        try:
+            if fut.result():
+                if self.archive is not None and not self.archive.record_clip(path):
+                    os.remove(path)   # its still was pruned while this was encoding
+                    return
+                self.clip_saved.emit(path)
+        except Exception as e:
+            self.clip_failed.emit(f"{path}: {e}")
+
+    def evict(self, now):
+        # keep CLIP_PRE s, or back to the oldest clip still waiting
+        with self.lock:
+            keep_from = min([now] + [c.trigger for c in self.clips]) - self.pre
+        for track in self.tracks:
+            while track and track[0][0] < keep_from:
+                self.bytes -= len(track.popleft()[1])
+        # hard cap, queued raw samples included: oldest samples of any camera first
+        while self.bytes + self.queued > self.cap and self.bytes:
+            track = min((t for t in self.tracks if t), key=lambda t: t[0][0])
+            self.bytes -= len(track.popleft()[1])
+
+    def shutdown(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.finish(time.perf_counter(), force=True)   # clips cut short rather than lost
+        self.pool.shutdown(wait=True)
+
+
+class CameraView(QWidget):
+    resized = Signal(int, int, float)
+
+    def __init__(self, metrics=None):
         super().__init__()
-        self.setScaledContents(True)
-        self.setStyleSheet("background-color: black;")
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.frame = None             # (array, QImage, grab time) from the mailbox
+        self.metrics = metrics
+        self.fresh = False            # frame not painted yet
+
+    def set_frame(self, item):
+        self.frame = item
+        self.fresh = True
+        self.update()
+
+    def resizeEvent(self, event):
+        self.resized.emit(self.width(), self.height(), self.devicePixelRatioF())
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        img = self.frame[1] if self.frame else None
+        if img is None or img.deviceIndependentSize().toSize() != self.size():
+            p.fillRect(self.rect(), Qt.black)   # no frame yet, or one from before a resize
+        if img is not None:
+            p.drawImage(0, 0, img)
+        p.end()
+        if self.fresh and self.metrics:
+            self.fresh = False
+            self.metrics.latency.add((time.perf_counter() - self.frame[2]) * 1000)
 
 
 class MainWindow(QWidget):
-    def __init__(self):
+    def __init__(self, cameras=CAMERAS):
         super().__init__()
 
         self.setWindowFlags(Qt.FramelessWindowHint)
@@ -84,15 +593,13 @@ class MainWindow(QWidget):
         cam_layout.setSpacing(0)
         cam_layout.setContentsMargins(0, 0, 0, 0)
 
-        for name in CAMERA_NAMES:
-            view = CameraView()
+        for spec in cameras:
+            thread = CameraThread(make_source(spec, **CAMERA_DEFAULTS))
+            view = CameraView(thread.metrics)
             cam_layout.addWidget(view)
             self.camera_views.append(view)
 
-            thread = CameraThread(name)
-            thread.frame_ready.connect(
-                lambda frame, v=view: self.update_view(v, frame)
-            )
+            view.resized.connect(thread.set_target_size)
             self.camera_threads.append(thread)
 
         self.input = QLineEdit()
@@ -103,23 +610,65 @@ class MainWindow(QWidget):
         self.scan_btn.setFixedHeight(40)
         self.scan_btn.clicked.connect(self.scan)
 
+        self.status = QLabel()
+        self.status.setFixedHeight(40)
+        self.status.setMinimumWidth(300)
+
         bottom = QHBoxLayout()
         bottom.addWidget(self.input)
         bottom.addWidget(self.scan_btn)
+        bottom.addWidget(self.status)
+
+        self.archive = CaptureArchive(SAVE_DIR, "." + SAVE_FORMAT.lower())
+        self.archive.start_pruning(RETENTION_DAYS if RETENTION_DAYS is not None and RETENTION_DAYS > 0 else None,
+                                   RETENTION_GB * 1024 ** 3 if RETENTION_GB is not None and RETENTION_GB > 0 else None)
+        self.saver = CaptureSaver(self.archive)
+        self.saver.saved.connect(self.on_saved)
+        self.saver.failed.connect(self.on_save_failed)
+        self.saver.pending_changed.connect(self.on_pending_changed)
 
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addLayout(cam_layout)
         layout.addLayout(bottom)
 
+        self.clips = None
+        if CLIP_ENABLED:
+            self.clips = ClipRecorder(len(self.camera_threads), archive=self.archive)
+            self.clips.clip_saved.connect(lambda path: self.status.setText(f"Clip saved: {path}"))
+            self.clips.clip_failed.connect(lambda msg: print(f"[ERROR] Clip failed: {msg}"))
+            for i, t in enumerate(self.camera_threads):
+                t.clip_sink = self.clips.sink(i)
+
         for t in self.camera_threads:
             t.start()
 
-    def update_view(self, view, frame):
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        img = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
-        view.setPixmap(QPixmap.fromImage(img))
+        # paint at the display refresh rate, whatever the cameras deliver
+        hz = self.screen().refreshRate() or 60
+        self.paint_timer = QTimer(self)
+        self.paint_timer.setTimerType(Qt.PreciseTimer)
+        self.paint_timer.timeout.connect(self.paint_frames)
+        self.paint_timer.start(max(1, round(1000 / hz)))
+
+        # telemetry
+        self.save_latency = RollingWindow()   # ms from scan to image on disk
+        self.save_pending = 0
+        self.hud = QLabel(self)
+        self.hud.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: #7CFC00; "
+                               "font-family: Consolas, monospace; font-size: 11px; padding: 6px;")
+        self.hud.hide()
+        self.hud_timer = QTimer(self)
+        self.hud_timer.timeout.connect(self.update_hud)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.log_metrics)
+        if METRICS_LOG:
+            self.metrics_timer.start(METRICS_INTERVAL * 1000)
+
+    def paint_frames(self):
+        for view, t in zip(self.camera_views, self.camera_threads):
+            item = t.mailbox.take()
+            if item is not None:
+                view.set_frame(item)
 
     def scan(self):
         name = self.input.text().strip()
@@ -127,54 +676,49 @@ class MainWindow(QWidget):
             self.popup("Error", "No scan text entered", QMessageBox.Warning)
             return
 
-        try:
-            os.makedirs(SAVE_DIR, exist_ok=True)
-
-            frames = []
-            for t in self.camera_threads:
-                if t.last_frame is not None:
-                    frames.append(t.last_frame.copy())
-
-            if not frames:
-                raise RuntimeError("No camera frames available")
-
-            stitched = np.hstack(frames)
-
-            timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            cv2.putText(
-                stitched,
-                timestamp,
-                (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 255, 0),
-                2
-            )
-
-            filename = self.unique_filename(name)
-            path = os.path.join(SAVE_DIR, filename)
-
-            if not cv2.imwrite(path, stitched):
-                raise IOError("Failed to save image")
-
-            self.popup("Success", f"Saved:\n{path}", QMessageBox.Information)
-            self.input.clear()
-
-        except PermissionError:
-            self.popup("Error", "No access to save location", QMessageBox.Critical)
-        except OSError as e:
-            self.popup("Error", f"OS Error:\n{e}", QMessageBox.Critical)
-        except Exception as e:
-            self.popup("Error", str(e), QMessageBox.Critical)
+        # the frame from each camera closest to the trigger, copied out of its ring
+        trigger = time.perf_counter() - SCAN_OFFSET
+        frames, cameras = [], []
+        for t in self.camera_threads:
+            frame, _ = t.ring.pick(trigger)
+            if frame is not None:
+                frames.append(frame)
+                cameras.append(t.device_name)
+        if not frames:
+            self.popup("Error", "No camera frames available", QMessageBox.Critical)
+            return
 
-    def unique_filename(self, base):
-        i = 0
-        while True:
-            suffix = f"_{i}" if i else ""
-            name = f"{base}{suffix}.jpg"
-            if not os.path.exists(os.path.join(SAVE_DIR, name)):
-                return name
-            i += 1
+        clip = self.clips.trigger(trigger) if self.clips else None
+        done = (lambda path: self.clips.output(clip, path)) if clip else None
+        if not self.saver.submit(name, frames, cameras, datetime.now(), done):
+            if clip:
+                self.clips.output(clip, None)
+            self.popup("Error", f"Save queue full ({SAVE_QUEUE} scans pending) - "
+                                "the disk is not keeping up, scan again shortly",
+                       QMessageBox.Warning)
+            return
+        self.status.setText(f"Queued: {name}")
+        self.input.clear()
+
+    def on_saved(self, code, path, ms):
+        self.save_latency.add(ms)
+        self.status.setText(f"Saved: {path}")
+
+    def on_save_failed(self, code, message):
+        self.status.setText(f"FAILED: {code}")
+        self.popup("Error", f"{code}: {message}", QMessageBox.Critical)
+
+    def on_pending_changed(self, pending):
+        self.save_pending = pending
+        # back-pressure: amber from half full, red when scans are being refused
+        if pending >= SAVE_QUEUE:
+            color = "#c00000"
+        elif pending >= SAVE_QUEUE // 2:
+            color = "#d08000"
+        else:
+            color = "black"
+        self.status.setStyleSheet(f"color: {color};")
+        self.scan_btn.setText(f"SCAN ({pending} saving)" if pending else "SCAN")
 
     def popup(self, title, text, icon):
         msg = QMessageBox(self)
@@ -183,20 +727,84 @@ class MainWindow(QWidget):
         msg.setIcon(icon)
         msg.exec()
 
+    def metrics(self):
+        return {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "cameras": {t.device_name: t.metrics.snapshot() for t in self.camera_threads},
+            "save_ms": rounded(self.save_latency.stats()),
+            "save_pending": self.save_pending,
+        }
+
+    def update_hud(self):
+        m = self.metrics()
+        lines = []
+        for name, c in m["cameras"].items():
+            conv = c["convert_ms"] or [0, 0, 0]
+            lat = c["latency_ms"] or [0, 0, 0]
+            lines.append(f"{name[:24]:24} {c['fps']:5.1f} fps  drop {c['dropped']:<5} skip {c['skipped']:<5} "
+                         f"conv {conv[0]:5.1f}/{conv[1]:5.1f} ms  lat {lat[0]:5.1f}/{lat[1]:5.1f} ms")
+        save = m["save_ms"] or [0, 0, 0]
+        lines.append(f"{'save':24} mean {save[0]:.0f} ms  p95 {save[1]:.0f} ms  pending {m['save_pending']}")
+        self.hud.setText("\n".join(lines))
+        self.hud.adjustSize()
+        self.hud.raise_()
+
+    def toggle_hud(self):
+        if self.hud.isVisible():
+            self.hud.hide()
+            self.hud_timer.stop()
+        else:
+            self.update_hud()
+            self.hud.move(10, 10)
+            self.hud.show()
+            self.hud_timer.start(500)
+
+    def log_metrics(self):
+        try:
+            with open(METRICS_LOG, "a") as f:
+                f.write(json.dumps(self.metrics()) + "\n")
+        except OSError as e:
+            print(f"[WARN] Cannot write metrics: {e}")
+
     def keyPressEvent(self, event):
         if (
             event.key() == EXIT_KEY[0]
             and event.modifiers() == EXIT_KEY[1]
         ):
             self.close()
+        elif event.key() == HUD_KEY:
+            self.toggle_hud()
 
     def closeEvent(self, event):
+        self.paint_timer.stop()
+        self.hud_timer.stop()
+        self.metrics_timer.stop()
+        if METRICS_LOG:
+            self.log_metrics()
         for t in self.camera_threads:
             t.stop()
+        self.saver.shutdown()      # let queued scans finish writing
+        if self.clips:
+            self.clips.shutdown()
+        self.archive.close()
         event.accept()
 
 
+def parse_args(argv):
+    p = argparse.ArgumentParser(description="Camera scan station.")
+    p.add_argument("--synthetic", type=int, metavar="N", help="Use N synthetic cameras instead of CAMERAS.")
+    p.add_argument("--size", default="1280x720", help="Synthetic frame size WxH (default 1280x720).")
+    p.add_argument("--fps", type=float, default=30, help="Synthetic frame rate (default 30).")
+    return p.parse_known_args(argv)    # the rest goes to Qt
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    win = MainWindow()
+    args, qt_args = parse_args(sys.argv[1:])
+    cameras = CAMERAS
+    if args.synthetic:
+        w, h = (int(v) for v in args.size.lower().split("x"))
+        cameras = [{"backend": "synthetic", "device": f"synthetic {i + 1}", "width": w, "height": h,
+                    "fps": args.fps} for i in range(args.synthetic)]
+    app = QApplication(sys.argv[:1] + qt_args)
+    win = MainWindow(cameras)
     sys.exit(app.exec())
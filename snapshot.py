@@ -0,0 +1,186 @@
+"""
+snapshot.py
+
+Renders the floorplan with device status dots to PNG, away from the GUI:
+all PIL work runs in worker processes.
+
+Output layout (out_dir):
+    tiles/<zoom>/<x>_<y>.png   one tile set per zoom level
+    floorplan.png              optional single downscaled image
+    manifest.json              per-tile signatures of the markers drawn on them
+    .base/<zoom>/<x>_<y>.png   map-only tiles, rebuilt only when the map changes
+
+Only tiles whose markers changed since the last export are re-rendered, and
+those start from the cached map-only tile, so a refresh where a handful of
+devices changed colour costs a handful of small PNG encodes.
+
+Used by `app.py --headless --snapshot DIR`.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+# ------------------------------
+# Worker side (PIL imported here only)
+# ------------------------------
+def atomic_save(img, path, **params):
+    # wall displays poll these files: never expose a half-written PNG
+    tmp = path + ".tmp"
+    img.save(tmp, format="PNG", **params)
+    os.replace(tmp, path)
+
+def scaled_map(map_path, zoom):
+    from PIL import Image
+    img = Image.open(map_path)
+    size = (max(1, round(img.width * zoom)), max(1, round(img.height * zoom)))
+    img.draft("RGB", size)          # JPEG: decode at reduced scale when zooming out
+    return img.convert("RGB").resize(size, Image.BILINEAR)
+
+def build_base_tiles(map_path, zoom, tile_size, base_dir):
+    """Slice the scaled map into map-only tiles. Returns the scaled size."""
+    img = scaled_map(map_path, zoom)
+    os.makedirs(base_dir, exist_ok=True)
+    w, h = img.size
+    for ty in range(-(-h // tile_size)):
+        for tx in range(-(-w // tile_size)):
+            box = (tx * tile_size, ty * tile_size,
+                   min(w, (tx + 1) * tile_size), min(h, (ty + 1) * tile_size))
+            atomic_save(img.crop(box), os.path.join(base_dir, f"{tx}_{ty}.png"), compress_level=1)
+    return w, h
+
+def draw_markers(img, markers, zoom, radius, ox=0, oy=0):
+    from PIL import ImageDraw
+    draw = ImageDraw.Draw(img)
+    for x, y, color in markers:
+        cx, cy = x * zoom - ox, y * zoom - oy
+        draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), fill=color, outline="black")
+
+def render_tiles(base_dir, tile_dir, zoom, tile_size, radius, tiles):
+    """Draw markers onto cached base tiles. tiles: [(tx, ty, markers)]."""
+    from PIL import Image
+    os.makedirs(tile_dir, exist_ok=True)
+    for tx, ty, markers in tiles:
+        with Image.open(os.path.join(base_dir, f"{tx}_{ty}.png")) as base:
+            img = base.convert("RGB")
+        draw_markers(img, markers, zoom, radius, tx * tile_size, ty * tile_size)
+        atomic_save(img, os.path.join(tile_dir, f"{tx}_{ty}.png"))
+    return len(tiles)
+
+def render_single(map_path, markers, width, radius, out_path):
+    """Whole floorplan downscaled to `width` pixels, markers on top."""
+    from PIL import Image
+    with Image.open(map_path) as probe:
+        zoom = width / probe.width
+    img = scaled_map(map_path, zoom)
+    draw_markers(img, markers, zoom, max(2.0, radius * zoom))
+    atomic_save(img, out_path)
+    return 1
+
+# ------------------------------
+# Exporter (main process, no PIL needed)
+# ------------------------------
+def signature(obj):
+    return hashlib.sha1(repr(obj).encode()).hexdigest()
+
+class SnapshotExporter:
+    def __init__(self, map_path, out_dir, zooms=(1.0,), tile_size=256, radius=10,
+                 single_width=None, workers=None, batch=64):
+        self.map_path = map_path
+        self.out_dir = out_dir
+        self.zooms = zooms
+        self.tile_size = tile_size
+        self.radius = radius
+        self.single_width = single_width
+        self.workers = workers      # None: one per CPU
+        self.batch = batch          # tiles per worker job
+        self.manifest_path = os.path.join(out_dir, "manifest.json")
+        self.pool = None
+
+    def load_manifest(self, map_sig):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        if manifest.get("map") != map_sig or manifest.get("tile_size") != self.tile_size:
+            manifest = {"map": map_sig, "tile_size": self.tile_size, "sizes": {}, "tiles": {}}
+        return manifest
+
+    def save_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def submit(self, fn, *args):
+        if self.pool is None:       # only pay for worker start-up when there is work
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool.submit(fn, *args)
+
+    def bucket(self, markers, zoom, radius, w, h):
+        # markers per tile, including dots that straddle a tile edge
+        ts = self.tile_size
+        tiles = {}
+        for m in markers:
+            x, y = m[0] * zoom, m[1] * zoom
+            for ty in range(max(0, int((y - radius) // ts)), min(-(-h // ts), int((y + radius) // ts) + 1)):
+                for tx in range(max(0, int((x - radius) // ts)), min(-(-w // ts), int((x + radius) // ts) + 1)):
+                    tiles.setdefault((tx, ty), []).append(m)
+        return tiles
+
+    def export(self, markers):
+        """markers: [(x, y, color)] in original map coordinates. Returns the
+        number of images written."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        st = os.stat(self.map_path)
+        manifest = self.load_manifest([os.path.abspath(self.map_path), st.st_mtime, st.st_size])
+        markers = sorted((round(x, 1), round(y, 1), c) for x, y, c in markers)
+        written = 0
+        try:
+            # map-only tiles, once per map version and zoom
+            pending = {}
+            for zoom in self.zooms:
+                z = f"{zoom:g}"
+                if z not in manifest["sizes"]:
+                    base_dir = os.path.join(self.out_dir, ".base", z)
+                    pending[z] = self.submit(build_base_tiles, self.map_path, zoom, self.tile_size, base_dir)
+            for z, fut in pending.items():
+                manifest["sizes"][z] = fut.result()
+
+            jobs = []
+            for zoom in self.zooms:
+                z = f"{zoom:g}"
+                w, h = manifest["sizes"][z]
+                radius = max(2.0, self.radius * zoom)
+                buckets = self.bucket(markers, zoom, radius, w, h)
+                changed = []
+                for ty in range(-(-h // self.tile_size)):
+                    for tx in range(-(-w // self.tile_size)):
+                        tile_markers = buckets.get((tx, ty), [])
+                        sig = signature(tile_markers)
+                        name = f"{z}/{tx}_{ty}"
+                        if manifest["tiles"].get(name) != sig:
+                            manifest["tiles"][name] = sig
+                            changed.append((tx, ty, tile_markers))
+                base_dir = os.path.join(self.out_dir, ".base", z)
+                tile_dir = os.path.join(self.out_dir, "tiles", z)
+                for i in range(0, len(changed), self.batch):
+                    jobs.append(self.submit(render_tiles, base_dir, tile_dir, zoom, self.tile_size,
+                                            radius, changed[i:i + self.batch]))
+
+            if self.single_width:
+                sig = signature([self.single_width, markers])
+                if manifest.get("single") != sig:
+                    manifest["single"] = sig
+                    jobs.append(self.submit(render_single, self.map_path, markers, self.single_width,
+                                            self.radius, os.path.join(self.out_dir, "floorplan.png")))
+
+            written = sum(f.result() for f in jobs)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+        self.save_manifest(manifest)
+        return written